@@ -1,1185 +1,54 @@
-import json
 import os
 import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import date
+from functools import lru_cache
 
 import streamlit as st
 
-try:
-    import google.generativeai as genai
-except ImportError:  # pragma: no cover - dependency is optional at runtime
-    genai = None
+from curriculum import STATUS_DONE, STATUS_LOCKED, CurriculumPack, decode_bits, encode_bits, load_pack
+from exercise_bank import ExerciseBank
+from exercise_cache import ExerciseCache
+from exercise_component import component_available, exercise_component, lesson_component
+from gateway import PRIORITY_INTERACTIVE, PRIORITY_PRACTICE, PRIORITY_PREFETCH, Gateway
+from gemini import ClientPool, backend_available, default_api_key, key_fingerprint
+from lesson_grid import LEVEL_ORDER, LessonGrid, grid_available
+from local_practice import LocalGenerator
+from model_ranking import ModelRanker
+from offline_lesson import OFFLINE_LESSONS, LessonResultError, aggregate_stats, validate_result
+from practice import PracticeStream, PrefetchPool, parse_ai_response, stream_exercises  # noqa: F401
+from progress_store import ProgressStore
+from resilience import BREAKER_CLOSED, BREAKER_OPEN, CircuitOpenError, Resilience
+from run_timing import RunTimings
+from session_store import SessionSync, backend_factory as session_backend_factory
+from theme import THEME_VERSION, inline_style, theme_asset_available, theme_loader
+from tutor_cache import SemanticCache
+from tutor_context import SummaryFolder, build_context, extractive_summary, model_summarizer, new_context_state
 
 
 APP_NAME = "LingoTutor"
 LANG_FLAGS = {"Inglês": "🇺🇸", "Espanhol": "🇪🇸"}
 XP_PER_EXERCISE = 10
+# totais por tipo de exercício das lições geradas, em profile["lesson_stats"]
+AI_LESSON_STATS = "ai"
+TUTOR_STREAMING = os.getenv("TUTOR_STREAMING", "1") != "0"
+TUTOR_UNAVAILABLE = "O tutor está fora do ar por alguns instantes. Tente de novo daqui a pouco."
+SHOW_RUN_TIMINGS = os.getenv("SHOW_RUN_TIMINGS") == "1"
+PRACTICE_STREAM_WAIT = float(os.getenv("PRACTICE_STREAM_WAIT", "30"))
+# mensagens do chat desenhadas por rerun; "Carregar anteriores" abre mais uma página
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
+WORKLOADS = {PRIORITY_INTERACTIVE: "tutor", PRIORITY_PRACTICE: "practice", PRIORITY_PREFETCH: "prefetch"}
+# resumo do chat: prioridade mais baixa e carga própria, sem hedge
+SUMMARY_WORKLOAD = "summary"
 
 
-CURRICULUM = {
-    "Inglês": {
-        "Básico": [
-            {
-                "id": "en-basic-1",
-                "title": "Saudações",
-                "icon": "👋",
-                "description": "Cumprimente e se apresente.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'Bom dia' em inglês?",
-                        "options": ["Good morning", "Good night", "See you later"],
-                        "answer": "Good morning",
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Prazer em conhecer você'.",
-                        "options": ["Nice to meet you", "See you soon", "Good luck"],
-                        "answer": "Nice to meet you",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte a frase: Meu nome é Ana.",
-                        "words": ["name", "is", "My", "Ana"],
-                        "answer": ["My", "name", "is", "Ana"],
-                    },
-                ],
-            },
-            {
-                "id": "en-basic-2",
-                "title": "No café",
-                "icon": "☕",
-                "description": "Peça bebidas simples.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como pedir um café educadamente?",
-                        "options": [
-                            "I'd like a coffee, please.",
-                            "Give me coffee.",
-                            "Bring coffee now.",
-                        ],
-                        "answer": "I'd like a coffee, please.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Onde fica o banheiro?",
-                        "words": ["the", "Where", "is", "bathroom", "?"],
-                        "answer": ["Where", "is", "the", "bathroom", "?"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Selecione a resposta para 'Obrigado':",
-                        "options": ["Thanks!", "Later", "Hello!"],
-                        "answer": "Thanks!",
-                    },
-                ],
-            },
-            {
-                "id": "en-basic-3",
-                "title": "Apresentações",
-                "icon": "🙋",
-                "description": "Fale sobre você e pergunte o nome.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar o nome de alguém?",
-                        "options": [
-                            "What's your name?",
-                            "Where are you?",
-                            "How old are you?",
-                        ],
-                        "answer": "What's your name?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu sou do Brasil.",
-                        "words": ["Brazil", "am", "I", "from"],
-                        "answer": ["I", "am", "from", "Brazil"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Escolha a resposta para 'Nice to meet you'.",
-                        "options": ["Nice to meet you too.", "Bye now.", "Good luck."],
-                        "answer": "Nice to meet you too.",
-                    },
-                ],
-            },
-            {
-                "id": "en-basic-4",
-                "title": "Números",
-                "icon": "🔢",
-                "description": "Conte de 1 a 10 em situações simples.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'sete' em inglês?",
-                        "options": ["seven", "six", "ten"],
-                        "answer": "seven",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu tenho três gatos.",
-                        "words": ["three", "have", "I", "cats"],
-                        "answer": ["I", "have", "three", "cats"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Qual é a tradução de 'nine'?",
-                        "options": ["nove", "cinco", "dez"],
-                        "answer": "nove",
-                    },
-                ],
-            },
-            {
-                "id": "en-basic-5",
-                "title": "Cores",
-                "icon": "🎨",
-                "description": "Reconheça e fale cores básicas.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Qual cor é 'red'?",
-                        "options": ["vermelho", "azul", "verde"],
-                        "answer": "vermelho",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu gosto da cor azul.",
-                        "words": ["blue", "color", "the", "like", "I"],
-                        "answer": ["I", "like", "the", "color", "blue"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'yellow'.",
-                        "options": ["amarelo", "cinza", "branco"],
-                        "answer": "amarelo",
-                    },
-                ],
-            },
-            {
-                "id": "en-basic-6",
-                "title": "Família",
-                "icon": "👨‍👩‍👧",
-                "description": "Fale sobre membros da família.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'irmã' em inglês?",
-                        "options": ["sister", "aunt", "mother"],
-                        "answer": "sister",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Meu pai é médico.",
-                        "words": ["is", "My", "father", "doctor", "a"],
-                        "answer": ["My", "father", "is", "a", "doctor"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'grandmother'.",
-                        "options": ["avó", "tio", "prima"],
-                        "answer": "avó",
-                    },
-                ],
-            },
-        ],
-        "Intermediário": [
-            {
-                "id": "en-inter-1",
-                "title": "Aeroporto",
-                "icon": "🛫",
-                "description": "Pergunte e responda no aeroporto.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'balcão de check-in'?",
-                        "options": ["Check-in counter", "Boarding gate", "Baggage claim"],
-                        "answer": "Check-in counter",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu tenho uma mala de mão.",
-                        "words": ["a", "carry-on", "bag", "have", "I", "."],
-                        "answer": ["I", "have", "a", "carry-on", "bag", "."],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Qual é o portão de embarque?'.",
-                        "options": [
-                            "What's the boarding gate?",
-                            "Where is the airplane?",
-                            "How long is the flight?",
-                        ],
-                        "answer": "What's the boarding gate?",
-                    },
-                ],
-            },
-            {
-                "id": "en-inter-2",
-                "title": "Hotel",
-                "icon": "🏨",
-                "description": "Faça check-in e tire dúvidas.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Tenho uma reserva'.",
-                        "options": [
-                            "I have a reservation.",
-                            "I need the receipt.",
-                            "I lost my luggage.",
-                        ],
-                        "answer": "I have a reservation.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Preciso de mais toalhas, por favor.",
-                        "words": ["more", "towels", "please", "I", "need", ","],
-                        "answer": ["I", "need", "more", "towels", ",", "please"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar pela senha do Wi-Fi?",
-                        "options": [
-                            "What's the Wi-Fi password?",
-                            "Where is the Wi-Fi?",
-                            "Do you sell Wi-Fi?",
-                        ],
-                        "answer": "What's the Wi-Fi password?",
-                    },
-                ],
-            },
-            {
-                "id": "en-inter-3",
-                "title": "Restaurante",
-                "icon": "🍝",
-                "description": "Faça pedidos detalhados e perguntas.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar se o prato é vegetariano?",
-                        "options": [
-                            "Is this dish vegetarian?",
-                            "Where is the chef?",
-                            "Do you like vegetables?",
-                        ],
-                        "answer": "Is this dish vegetarian?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu gostaria de reservar uma mesa para dois.",
-                        "words": ["for", "table", "like", "two", "a", "would", "I", "to", "reserve"],
-                        "answer": ["I", "would", "like", "to", "reserve", "a", "table", "for", "two"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Could we have the check, please?'.",
-                        "options": [
-                            "Poderíamos ter a conta, por favor?",
-                            "Podemos trocar de mesa?",
-                            "Tem Wi-Fi aqui?",
-                        ],
-                        "answer": "Poderíamos ter a conta, por favor?",
-                    },
-                ],
-            },
-            {
-                "id": "en-inter-4",
-                "title": "Compras",
-                "icon": "🛍️",
-                "description": "Negocie preços e peça tamanhos.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar outro tamanho?",
-                        "options": [
-                            "Do you have this in a different size?",
-                            "Where is the cashier?",
-                            "Can I get a discount?",
-                        ],
-                        "answer": "Do you have this in a different size?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Você tem esse modelo em preto?",
-                        "words": ["this", "in", "black", "you", "Do", "have", "model"],
-                        "answer": ["Do", "you", "have", "this", "model", "in", "black"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor frase para pedir desconto?",
-                        "options": [
-                            "Is there any discount available?",
-                            "Give me a discount now.",
-                            "How much is your salary?",
-                        ],
-                        "answer": "Is there any discount available?",
-                    },
-                ],
-            },
-            {
-                "id": "en-inter-5",
-                "title": "Transporte",
-                "icon": "🚌",
-                "description": "Use ônibus, metrô e táxi.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar o horário do próximo ônibus?",
-                        "options": [
-                            "What time is the next bus?",
-                            "Where is the bus color?",
-                            "Do you drive a bus?",
-                        ],
-                        "answer": "What time is the next bus?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Preciso de um táxi até o hotel.",
-                        "words": ["to", "a", "Need", "hotel", "taxi", "the", "I"],
-                        "answer": ["I", "Need", "a", "taxi", "to", "the", "hotel"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Where is the subway station?'.",
-                        "options": [
-                            "Onde fica a estação de metrô?",
-                            "Quanto custa a passagem?",
-                            "Você aceita cartão?",
-                        ],
-                        "answer": "Onde fica a estação de metrô?",
-                    },
-                ],
-            },
-            {
-                "id": "en-inter-6",
-                "title": "Consultório",
-                "icon": "🩺",
-                "description": "Explique sintomas e receba instruções.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer que está com dor de cabeça?",
-                        "options": [
-                            "I have a headache.",
-                            "My head is breakfast.",
-                            "I need a new head.",
-                        ],
-                        "answer": "I have a headache.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Estou tomando este remédio duas vezes ao dia.",
-                        "words": ["a", "day", "taking", "twice", "I", "am", "this", "medicine"],
-                        "answer": ["I", "am", "taking", "this", "medicine", "twice", "a", "day"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'You should rest and drink water'.",
-                        "options": [
-                            "Você deve descansar e beber água",
-                            "Você deve correr agora",
-                            "Você deve trabalhar mais",
-                        ],
-                        "answer": "Você deve descansar e beber água",
-                    },
-                ],
-            },
-        ],
-        "Avançado": [
-            {
-                "id": "en-adv-1",
-                "title": "Reunião",
-                "icon": "💼",
-                "description": "Use frases formais em reuniões.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Escolha a melhor forma de sugerir uma pausa.",
-                        "options": [
-                            "Shall we take a short break?",
-                            "Stop talking now.",
-                            "Let's end the meeting.",
-                        ],
-                        "answer": "Shall we take a short break?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Se eu soubesse, teria preparado slides.",
-                        "words": ["known", "prepared", "If", "slides", "had", "I", "would", "have", "I", ","],
-                        "answer": ["If", "I", "had", "known", ",", "I", "would", "have", "prepared", "slides"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Vamos retomar esse ponto mais tarde'.",
-                        "options": [
-                            "Let's revisit this point later.",
-                            "Stop this conversation now.",
-                            "We will cancel this topic.",
-                        ],
-                        "answer": "Let's revisit this point later.",
-                    },
-                ],
-            }
-            ,
-            {
-                "id": "en-adv-2",
-                "title": "Apresentações",
-                "icon": "📊",
-                "description": "Estruture apresentações e pontos-chave.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Melhor forma de introduzir um gráfico?",
-                        "options": [
-                            "As we can see in this chart...",
-                            "Look at this thing.",
-                            "Here is a picture.",
-                        ],
-                        "answer": "As we can see in this chart...",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Vamos passar para a próxima seção.",
-                        "words": ["move", "next", "section", "to", "Let's", "the"],
-                        "answer": ["Let's", "move", "to", "the", "next", "section"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Let's keep this slide brief'.",
-                        "options": [
-                            "Vamos manter este slide breve.",
-                            "Vamos pular este slide.",
-                            "Vamos imprimir este slide.",
-                        ],
-                        "answer": "Vamos manter este slide breve.",
-                    },
-                ],
-            },
-            {
-                "id": "en-adv-3",
-                "title": "Negociação",
-                "icon": "🤝",
-                "description": "Negocie prazos e condições.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como propor um prazo mais longo?",
-                        "options": [
-                            "Could we extend the deadline by a week?",
-                            "Give me more time now.",
-                            "Do you like deadlines?",
-                        ],
-                        "answer": "Could we extend the deadline by a week?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Podemos discutir um desconto maior?",
-                        "words": ["a", "discount", "We", "larger", "discuss", "can", "?"],
-                        "answer": ["We", "can", "discuss", "a", "larger", "discount", "?"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor frase para encerrar negociação cordialmente:",
-                        "options": [
-                            "Let's revisit this tomorrow with fresh numbers.",
-                            "We are done. Bye.",
-                            "No deal, forget it.",
-                        ],
-                        "answer": "Let's revisit this tomorrow with fresh numbers.",
-                    },
-                ],
-            },
-            {
-                "id": "en-adv-4",
-                "title": "Feedback",
-                "icon": "📝",
-                "description": "Dê e receba feedback construtivo.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como suavizar uma crítica?",
-                        "options": [
-                            "One area we could improve is...",
-                            "This is terrible.",
-                            "You failed again.",
-                        ],
-                        "answer": "One area we could improve is...",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Agradeço o retorno detalhado.",
-                        "words": ["feedback", "the", "appreciate", "detailed", "I"],
-                        "answer": ["I", "appreciate", "the", "detailed", "feedback"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Could you elaborate on that point?'.",
-                        "options": [
-                            "Você poderia detalhar esse ponto?",
-                            "Você pode repetir isso rápido?",
-                            "Você pode falar mais baixo?",
-                        ],
-                        "answer": "Você poderia detalhar esse ponto?",
-                    },
-                ],
-            },
-            {
-                "id": "en-adv-5",
-                "title": "Entrevista",
-                "icon": "🎤",
-                "description": "Responda perguntas comportamentais.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como iniciar uma resposta STAR?",
-                        "options": [
-                            "In that situation, my task was...",
-                            "I don't remember.",
-                            "It was fine.",
-                        ],
-                        "answer": "In that situation, my task was...",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: O resultado foi um aumento de 20% nas vendas.",
-                        "words": ["The", "increase", "20%", "sales", "in", "was", "result", "an"],
-                        "answer": ["The", "result", "was", "an", "increase", "of", "20%", "in", "sales"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor forma de falar sobre um erro:",
-                        "options": [
-                            "I learned from that mistake and improved my process.",
-                            "It wasn't my fault.",
-                            "I never make mistakes.",
-                        ],
-                        "answer": "I learned from that mistake and improved my process.",
-                    },
-                ],
-            },
-            {
-                "id": "en-adv-6",
-                "title": "Escrita formal",
-                "icon": "✉️",
-                "description": "Escreva e-mails formais e resumos.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como solicitar confirmação de recebimento?",
-                        "options": [
-                            "Please confirm receipt at your earliest convenience.",
-                            "Did you get it?",
-                            "Answer me now.",
-                        ],
-                        "answer": "Please confirm receipt at your earliest convenience.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Anexo segue o relatório solicitado.",
-                        "words": ["report", "requested", "Attached", "is", "the"],
-                        "answer": ["Attached", "is", "the", "requested", "report"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Looking forward to your response'.",
-                        "options": [
-                            "Aguardo seu retorno",
-                            "Até mais",
-                            "Aguarde minha resposta",
-                        ],
-                        "answer": "Aguardo seu retorno",
-                    },
-                ],
-            },
-        ],
-    },
-    "Espanhol": {
-        "Básico": [
-            {
-                "id": "es-basic-1",
-                "title": "Saludos",
-                "icon": "🙋",
-                "description": "Cumprimente e apresente-se.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'Boa tarde' em espanhol?",
-                        "options": ["Buenas tardes", "Buenos días", "Buenas noches"],
-                        "answer": "Buenas tardes",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Meu nome é Carla.",
-                        "words": ["Carla", "es", "nombre", "Mi"],
-                        "answer": ["Mi", "nombre", "es", "Carla"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Prazer em conhecê-lo'.",
-                        "options": [
-                            "Encantado de conocerte",
-                            "Hasta pronto",
-                            "Cuídate",
-                        ],
-                        "answer": "Encantado de conocerte",
-                    },
-                ],
-            },
-            {
-                "id": "es-basic-2",
-                "title": "Restaurante",
-                "icon": "🍽️",
-                "description": "Peça comida de forma cortês.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como pedir a conta?",
-                        "options": [
-                            "La cuenta, por favor.",
-                            "El baño, por favor.",
-                            "Otra mesa, por favor.",
-                        ],
-                        "answer": "La cuenta, por favor.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu gostaria de água sem gás.",
-                        "words": ["agua", "sin", "gas", "me", "gustaría", "de"],
-                        "answer": ["Me", "gustaría", "agua", "sin", "gas"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Escolha a tradução para 'obrigado'.",
-                        "options": ["Gracias", "Perdón", "Hola"],
-                        "answer": "Gracias",
-                    },
-                ],
-            },
-            {
-                "id": "es-basic-3",
-                "title": "Presentaciones",
-                "icon": "👥",
-                "description": "Apresente-se e pergunte nomes.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar 'Qual é o seu nome?'",
-                        "options": [
-                            "¿Cómo te llamas?",
-                            "¿Dónde estás?",
-                            "¿Qué hora es?",
-                        ],
-                        "answer": "¿Cómo te llamas?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Sou do Brasil.",
-                        "words": ["Brasil", "soy", "de", "Yo"],
-                        "answer": ["Yo", "soy", "de", "Brasil"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Resposta apropriada para 'Encantado de conocerte'.",
-                        "options": ["Igualmente.", "Hasta mañana.", "No gracias."],
-                        "answer": "Igualmente.",
-                    },
-                ],
-            },
-            {
-                "id": "es-basic-4",
-                "title": "Números",
-                "icon": "🔢",
-                "description": "Use números de 1 a 10.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'cinco' em espanhol?",
-                        "options": ["cinco", "siete", "ocho"],
-                        "answer": "cinco",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Tenho duas irmãs.",
-                        "words": ["hermanas", "dos", "Tengo"],
-                        "answer": ["Tengo", "dos", "hermanas"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'nueve'.",
-                        "options": ["nove", "cinco", "quatro"],
-                        "answer": "nove",
-                    },
-                ],
-            },
-            {
-                "id": "es-basic-5",
-                "title": "Colores",
-                "icon": "🎨",
-                "description": "Fale sobre cores comuns.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Qual é a tradução de 'rojo'?",
-                        "options": ["vermelho", "azul", "preto"],
-                        "answer": "vermelho",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Eu gosto da cor verde.",
-                        "words": ["verde", "color", "me", "gusta", "el"],
-                        "answer": ["Me", "gusta", "el", "color", "verde"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'amarillo'.",
-                        "options": ["amarelo", "branco", "marrom"],
-                        "answer": "amarelo",
-                    },
-                ],
-            },
-            {
-                "id": "es-basic-6",
-                "title": "Familia",
-                "icon": "👨‍👩‍👧",
-                "description": "Descreva sua família.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer 'irmão' em espanhol?",
-                        "options": ["hermano", "tío", "primo"],
-                        "answer": "hermano",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Minha mãe é professora.",
-                        "words": ["profesora", "Mi", "es", "madre"],
-                        "answer": ["Mi", "madre", "es", "profesora"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'abuelo'.",
-                        "options": ["avô", "irmão", "sobrinho"],
-                        "answer": "avô",
-                    },
-                ],
-            },
-        ],
-        "Intermediário": [
-            {
-                "id": "es-inter-1",
-                "title": "Hotel",
-                "icon": "🏨",
-                "description": "Check-in e dúvidas comuns.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Tenho uma reserva'.",
-                        "options": [
-                            "Tengo una reserva.",
-                            "Necesito una cama.",
-                            "Perdí mi pasaporte.",
-                        ],
-                        "answer": "Tengo una reserva.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: A que horas é o café da manhã?",
-                        "words": ["el", "desayuno", "es", "¿A", "qué", "hora", "?"],
-                        "answer": ["¿A", "qué", "hora", "es", "el", "desayuno", "?"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar pela senha do Wi-Fi?",
-                        "options": [
-                            "¿Cuál es la contraseña del Wi-Fi?",
-                            "¿Dónde está el Wi-Fi?",
-                            "¿Vende Wi-Fi?",
-                        ],
-                        "answer": "¿Cuál es la contraseña del Wi-Fi?",
-                    },
-                ],
-            },
-            {
-                "id": "es-inter-2",
-                "title": "Passeio",
-                "icon": "🗺️",
-                "description": "Peça direções e informações.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Quanto custa a entrada?'.",
-                        "options": [
-                            "¿Cuánto cuesta la entrada?",
-                            "¿Dónde está la entrada?",
-                            "¿Puedo salir ahora?",
-                        ],
-                        "answer": "¿Cuánto cuesta la entrada?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Estou procurando a estação de metrô.",
-                        "words": ["buscando", "estoy", "metro", "estación", "la", "de"],
-                        "answer": ["Estoy", "buscando", "la", "estación", "de", "metro"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Escolha a melhor opção para pedir ajuda.",
-                        "options": [
-                            "¿Puedes ayudarme?",
-                            "Necesito un taxi.",
-                            "Hasta luego.",
-                        ],
-                        "answer": "¿Puedes ayudarme?",
-                    },
-                ],
-            },
-            {
-                "id": "es-inter-3",
-                "title": "Restaurante",
-                "icon": "🍲",
-                "description": "Peça pratos e tire dúvidas do cardápio.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar se o prato é picante?",
-                        "options": [
-                            "¿Es picante este plato?",
-                            "¿Dónde está el picante?",
-                            "¿Cuánto cuesta el picante?",
-                        ],
-                        "answer": "¿Es picante este plato?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Poderia trazer água sem gelo?",
-                        "words": ["sin", "Podría", "agua", "traer", "hielo", "?"],
-                        "answer": ["Podría", "traer", "agua", "sin", "hielo", "?"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'La cuenta, por favor'.",
-                        "options": [
-                            "A conta, por favor.",
-                            "A sobremesa, por favor.",
-                            "A água, por favor.",
-                        ],
-                        "answer": "A conta, por favor.",
-                    },
-                ],
-            },
-            {
-                "id": "es-inter-4",
-                "title": "Compras",
-                "icon": "🛒",
-                "description": "Peça tamanhos, preços e descontos.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar outro tamanho?",
-                        "options": [
-                            "¿Tiene otra talla?",
-                            "¿Dónde está la talla?",
-                            "¿Qué talla soy yo?",
-                        ],
-                        "answer": "¿Tiene otra talla?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Quanto custa este casaco?",
-                        "words": ["cuesta", "este", "abrigo", "?", "¿Cuánto"],
-                        "answer": ["¿Cuánto", "cuesta", "este", "abrigo", "?"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor frase para pedir desconto.",
-                        "options": [
-                            "¿Hay algún descuento disponible?",
-                            "Dame descuento ahora.",
-                            "No quiero pagar.",
-                        ],
-                        "answer": "¿Hay algún descuento disponible?",
-                    },
-                ],
-            },
-            {
-                "id": "es-inter-5",
-                "title": "Transporte",
-                "icon": "🚇",
-                "description": "Use metrô, ônibus e táxi.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como perguntar o horário do próximo metrô?",
-                        "options": [
-                            "¿A qué hora pasa el próximo metro?",
-                            "¿Dónde compro um metrô?",
-                            "¿Te gusta el metro?",
-                        ],
-                        "answer": "¿A qué hora pasa el próximo metro?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Preciso de um táxi até o aeroporto.",
-                        "words": ["un", "Necesito", "taxi", "hasta", "aeropuerto", "el"],
-                        "answer": ["Necesito", "un", "taxi", "hasta", "el", "aeropuerto"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza '¿Dónde se compra el billete?'.",
-                        "options": [
-                            "Onde se compra o bilhete?",
-                            "Quanto custa a passagem?",
-                            "Qual é a cor do bilhete?",
-                        ],
-                        "answer": "Onde se compra o bilhete?",
-                    },
-                ],
-            },
-            {
-                "id": "es-inter-6",
-                "title": "Saúde",
-                "icon": "🏥",
-                "description": "Descreva sintomas e entenda recomendações.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como dizer que está com febre?",
-                        "options": [
-                            "Tengo fiebre.",
-                            "Tengo hambre.",
-                            "Tengo prisa.",
-                        ],
-                        "answer": "Tengo fiebre.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Estou tomando este remédio três vezes ao dia.",
-                        "words": ["veces", "al", "día", "este", "tomando", "Estoy", "medicamento", "tres"],
-                        "answer": ["Estoy", "tomando", "este", "medicamento", "tres", "veces", "al", "día"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Debe descansar y tomar agua'.",
-                        "options": [
-                            "Você deve descansar e tomar água",
-                            "Você deve correr",
-                            "Você deve trabalhar",
-                        ],
-                        "answer": "Você deve descansar e tomar água",
-                    },
-                ],
-            },
-        ],
-        "Avançado": [
-            {
-                "id": "es-adv-1",
-                "title": "Negócios",
-                "icon": "💼",
-                "description": "Converse em reuniões formais.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Vamos analisar os resultados'.",
-                        "options": [
-                            "Vamos analizar los resultados.",
-                            "Vamos cerrar el trato.",
-                            "Vamos cancelar la reunión.",
-                        ],
-                        "answer": "Vamos analizar los resultados.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Se concordarmos, assinaremos hoje.",
-                        "words": ["hoy", "firmaremos", "Si", "estamos", "de", "acuerdo", ","],
-                        "answer": ["Si", "estamos", "de", "acuerdo", ",", "firmaremos", "hoy"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor frase para encerrar um e-mail?",
-                        "options": [
-                            "Quedo atento a sus comentarios.",
-                            "No responda este correo.",
-                            "No me llames más.",
-                        ],
-                        "answer": "Quedo atento a sus comentarios.",
-                    },
-                ],
-            }
-            ,
-            {
-                "id": "es-adv-2",
-                "title": "Presentaciones",
-                "icon": "📊",
-                "description": "Estruture apresentações formais.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como introduzir um slide?",
-                        "options": [
-                            "Como pueden ver en esta diapositiva...",
-                            "Mira isso.",
-                            "Esto es algo.",
-                        ],
-                        "answer": "Como pueden ver en esta diapositiva...",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Vamos passar ao próximo tema.",
-                        "words": ["al", "tema", "pasar", "Vamos", "siguiente"],
-                        "answer": ["Vamos", "pasar", "al", "siguiente", "tema"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Mantengamos este punto breve'.",
-                        "options": [
-                            "Mantenhamos este ponto breve.",
-                            "Vamos pular este ponto.",
-                            "Vamos alongar este ponto.",
-                        ],
-                        "answer": "Mantenhamos este ponto breve.",
-                    },
-                ],
-            },
-            {
-                "id": "es-adv-3",
-                "title": "Negociación",
-                "icon": "🤝",
-                "description": "Negocie prazos e condições.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como pedir extensão de prazo?",
-                        "options": [
-                            "¿Podemos extender el plazo una semana?",
-                            "Dame mais tempo.",
-                            "No quero prazo.",
-                        ],
-                        "answer": "¿Podemos extender el plazo una semana?",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Podemos revisar o desconto amanhã.",
-                        "words": ["revisar", "Podemos", "descuento", "mañana", "el"],
-                        "answer": ["Podemos", "revisar", "el", "descuento", "mañana"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor frase para encerrar negociação:",
-                        "options": [
-                            "Volvamos a hablar mañana con más datos.",
-                            "Acabou. Tchau.",
-                            "Nunca mais fale comigo.",
-                        ],
-                        "answer": "Volvamos a hablar mañana con más datos.",
-                    },
-                ],
-            },
-            {
-                "id": "es-adv-4",
-                "title": "Feedback",
-                "icon": "📝",
-                "description": "Dê devolutivas construtivas.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como suavizar uma crítica?",
-                        "options": [
-                            "Un área que podemos mejorar es...",
-                            "Esto está muy mal.",
-                            "No sirves.",
-                        ],
-                        "answer": "Un área que podemos mejorar es...",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Obrigado pelo feedback detalhado.",
-                        "words": ["Gracias", "detalle", "el", "feedback", "por"],
-                        "answer": ["Gracias", "por", "el", "feedback", "detalle"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza '¿Podrías profundizar en ese punto?'.",
-                        "options": [
-                            "Você poderia detalhar esse ponto?",
-                            "Você pode parar de falar?",
-                            "Você pode gritar?",
-                        ],
-                        "answer": "Você poderia detalhar esse ponto?",
-                    },
-                ],
-            },
-            {
-                "id": "es-adv-5",
-                "title": "Entrevista",
-                "icon": "🎤",
-                "description": "Responda perguntas de forma estruturada.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como iniciar resposta STAR?",
-                        "options": [
-                            "En esa situación, mi tarea era...",
-                            "No recuerdo.",
-                            "No importa.",
-                        ],
-                        "answer": "En esa situación, mi tarea era...",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: O resultado foi reduzir custos em 15%.",
-                        "words": ["resultó", "El", "en", "15%", "costos", "reducir"],
-                        "answer": ["El", "resultado", "fue", "reducir", "costos", "en", "15%"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Melhor forma de falar sobre erro:",
-                        "options": [
-                            "Aprendí de ese error y mejoré mi proceso.",
-                            "No fue culpa minha.",
-                            "Nunca erro.",
-                        ],
-                        "answer": "Aprendí de ese error y mejoré mi proceso.",
-                    },
-                ],
-            },
-            {
-                "id": "es-adv-6",
-                "title": "Redacción formal",
-                "icon": "✉️",
-                "description": "Escreva e-mails formais e resumos.",
-                "exercises": [
-                    {
-                        "type": "select",
-                        "prompt": "Como pedir confirmação de recebimento?",
-                        "options": [
-                            "Por favor, confirma de recibido.",
-                            "Recebeste?",
-                            "Manda aí.",
-                        ],
-                        "answer": "Por favor, confirma de recibido.",
-                    },
-                    {
-                        "type": "arrange",
-                        "prompt": "Monte: Anexo o relatório solicitado.",
-                        "words": ["solicitado", "Adjunto", "reporte", "el"],
-                        "answer": ["Adjunto", "el", "reporte", "solicitado"],
-                    },
-                    {
-                        "type": "select",
-                        "prompt": "Traduza 'Quedo atento a tu respuesta'.",
-                        "options": [
-                            "Fico atento à sua resposta",
-                            "Fico atento ao seu pagamento",
-                            "Não responderei",
-                        ],
-                        "answer": "Fico atento à sua resposta",
-                    },
-                ],
-            },
-        ],
-    },
-}
+@st.cache_resource(show_spinner=False)
+def get_curriculum() -> CurriculumPack:
+    """Pacote do currículo carregado uma vez por processo e compartilhado entre sessões."""
+    return load_pack()
 
 
 def init_session_state() -> None:
@@ -1188,202 +57,105 @@ def init_session_state() -> None:
         "language": None,
         "profiles": {},
         "chat_history": {},
+        "chat_window": {},
         "current_lesson": None,
         "current_exercise_index": 0,
         "last_feedback": None,
         "arrange_pool": [],
         "arrange_answer": [],
+        "seen_practice_sets": [],
+        "seen_bank_exercises": [],
+        "tutor_context": {},
+        "celebrate": False,
         "api_key": None,
-        "model_key": None,
     }
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
 
 
+LEARNER_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def resume_progress() -> None:
+    """No começo da sessão: identifica o aluno pela URL e recupera o progresso salvo."""
+    if st.session_state.get("learner_id"):
+        return
+    learner_id = st.query_params.get("learner", "")
+    if not LEARNER_ID.match(learner_id):
+        learner_id = uuid.uuid4().hex
+        st.query_params["learner"] = learner_id
+    st.session_state.learner_id = learner_id
+    sync = get_session_sync()
+    # sessão ainda viva em outro worker (ou antes de um redeploy): continua exatamente de onde parou
+    if sync is not None and sync.hydrate(learner_id, st.session_state):
+        return
+    saved = get_progress_store().load(learner_id)
+    if not saved:
+        return
+    st.session_state.profiles = saved["profiles"]
+    st.session_state.chat_history = saved["chat_history"]
+    if saved["language"] in get_curriculum().languages:
+        st.session_state.language = saved["language"]
+        st.session_state.view = "dashboard"
+
+
+def persist_progress(chat: bool = False) -> None:
+    """Enfileira perfis (e o chat, se mudou) para gravação; não espera o disco."""
+    learner_id = st.session_state.get("learner_id")
+    if not learner_id:
+        return
+    get_progress_store().save(
+        learner_id,
+        language=st.session_state.get("language"),
+        profiles=st.session_state["profiles"],
+        chat_history=st.session_state["chat_history"] if chat else None,
+    )
+
+
+@contextmanager
+def session_synced():
+    """Ao fim da execução (app ou fragmento, inclusive em ``st.rerun``), grava só as chaves que mudaram."""
+    try:
+        yield
+    finally:
+        learner_id = st.session_state.get("learner_id")
+        sync = get_session_sync()
+        if learner_id and sync is not None:
+            sync.sync(learner_id, st.session_state)
+
+
+def theme_loaded(key: str) -> None:
+    st.session_state["theme"] = st.session_state.get(key)
+
+
 def inject_css() -> None:
     st.set_page_config(page_title=APP_NAME, page_icon="🦜", layout="wide")
-    hide = """
-    <style>
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        .block-container {padding-top: 2rem;}
-        /* garante que o toggle da sidebar continue acessível */
-        [data-testid="collapsedControl"] {opacity: 1; pointer-events: auto;}
-        /* Sidebar tema escuro (versão anterior) com navegação aprimorada */
-        [data-testid="stSidebar"] > div:first-child {
-            background: linear-gradient(180deg, #0f172a 0%, #111827 100%);
-            color: #e5e7eb;
-            padding-top: 1rem;
-            border-right: 1px solid #111827;
-        }
-        [data-testid="stSidebar"] h1, 
-        [data-testid="stSidebar"] h2, 
-        [data-testid="stSidebar"] h3, 
-        [data-testid="stSidebar"] h4, 
-        [data-testid="stSidebar"] h5, 
-        [data-testid="stSidebar"] h6, 
-        [data-testid="stSidebar"] p, 
-        [data-testid="stSidebar"] label {
-            color: #e5e7eb !important;
-        }
-        [data-testid="stSidebar"] .stTextInput input {
-            background: #0b1220;
-            color: #e5e7eb;
-            border: 1px solid #1f2937;
-            border-radius: 10px;
-        }
-        [data-testid="stSidebar"] .stButton button {
-            width: 100%;
-            text-align: center;
-            background: #0f172a;
-            color: #e5e7eb;
-            border: 1px solid #1f2937;
-            border-radius: 12px;
-            padding: 0.65rem 0.9rem;
-            font-weight: 600;
-            box-shadow: none;
-        }
-        [data-testid="stSidebar"] .stButton button:hover {
-            background: #111827;
-            border-color: #10b981;
-        }
-        [data-testid="stSidebar"] .stButton button:focus {
-            background: #111827;
-            border-color: #10b981;
-            color: #e5e7eb;
-        }
-        /* cartão de status */
-        .sidebar-card {
-            background: #0b1220;
-            border: 1px solid #1f2937;
-            border-radius: 14px;
-            padding: 0.9rem;
-            box-shadow: 0 6px 18px rgba(0, 0, 0, 0.25);
-        }
-        .sidebar-tag {
-            display: inline-block;
-            background: #10b981;
-            color: #0b1220;
-            padding: 0.15rem 0.5rem;
-            border-radius: 8px;
-            font-size: 0.75rem;
-            font-weight: 600;
-        }
-        .sidebar-card p, .sidebar-card strong {
-            color: #e5e7eb;
-        }
-        /* Botões principais (fora da sidebar) em verde */
-        div.stButton > button {
-            background: #10b981;
-            color: #0b1220;
-            border: none;
-            border-radius: 10px;
-            font-weight: 700;
-        }
-        div.stButton > button:hover {
-            background: #34d399;
-        }
-        /* Cards de lições */
-        .lesson-card {
-            background: #ffffff;
-            border: 1px solid #e5e7eb;
-            border-radius: 16px;
-            padding: 1rem;
-            box-shadow: 0 10px 30px rgba(15, 23, 42, 0.08);
-            margin-bottom: 0.5rem;
-            min-height: 230px;
-            display: flex;
-            flex-direction: column;
-        }
-        .lesson-head {
-            display: flex;
-            align-items: center;
-            gap: 0.75rem;
-        }
-        .lesson-icon {
-            width: 44px;
-            height: 44px;
-            border-radius: 12px;
-            background: #e2e8f0;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 22px;
-            color: #0f172a;
-        }
-        .lesson-title {
-            font-weight: 700;
-            color: #0f172a;
-            font-size: 1rem;
-        }
-        .lesson-level {
-            color: #6b7280;
-            font-size: 0.85rem;
-            font-weight: 600;
-        }
-        .lesson-desc {
-            color: #475569;
-            margin: 0.65rem 0 0.5rem;
-            font-size: 0.95rem;
-            min-height: 48px;
-        }
-        .lesson-footer {
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            margin-top: 0.5rem;
-            margin-top: auto;
-        }
-        .status-pill {
-            display: inline-block;
-            padding: 0.35rem 0.6rem;
-            border-radius: 999px;
-            font-weight: 700;
-            font-size: 0.8rem;
-        }
-        .status-open { background: #e8fff4; color: #047857; border: 1px solid #10b981; }
-        .status-locked { background: #f3f4f6; color: #6b7280; border: 1px solid #e5e7eb; }
-        .status-done { background: #eef2ff; color: #4338ca; border: 1px solid #c7d2fe; }
-        /* Opções de múltipla escolha: manter estilo padrão, só aumentar fonte */
-        [data-testid="stRadio"] label {
-            font-size: 1rem;
-            color: #111827 !important;
-        }
-        /* Chat input fixo, alinhado ao centro do conteúdo */
-        [data-testid="stChatInput"] {
-            position: fixed;
-            bottom: 0;
-            left: 50%;
-            transform: translateX(-50%);
-            width: min(860px, 92vw);
-            z-index: 20;
-            background: #0b1220;
-            padding: 0.75rem 1rem 1rem;
-            box-shadow: 0 -8px 24px rgba(0,0,0,0.35);
-            border-radius: 12px 12px 0 0;
-        }
-        /* reserva espaço para o input fixo */
-        .block-container {
-            padding-bottom: 9rem;
-        }
-    </style>
-    """
-    st.markdown(hide, unsafe_allow_html=True)
+    loaded = st.session_state.get("theme") or {}
+    confirmed = loaded.get("version") == THEME_VERSION
+    if not (theme_asset_available() and confirmed and loaded.get("ok")):
+        st.markdown(inline_style(), unsafe_allow_html=True)
+    if theme_asset_available() and not confirmed:
+        # só até o navegador confirmar o <link> do tema; depois nenhum rerun manda CSS
+        theme_loader(key="theme-loader", on_loaded=theme_loaded, args=("theme-loader",))
 
 
-def resolve_api_key() -> str | None:
-    stored = st.session_state.get("api_key")
-    if stored:
-        return stored
+def configured_api_key() -> str | None:
+    """Chave do servidor (secrets ou ``GEMINI_API_KEY``), nunca a digitada pelo aluno."""
     key = None
     # st.secrets pode não existir; proteger para evitar StreamlitSecretNotFoundError
     try:
         key = st.secrets.get("GEMINI_API_KEY")  # type: ignore[attr-defined]
     except Exception:
         key = None
-    if not key and os.getenv("GEMINI_API_KEY"):
-        key = os.getenv("GEMINI_API_KEY")
+    return key or os.getenv("GEMINI_API_KEY") or None
+
+
+def resolve_api_key() -> str | None:
+    stored = st.session_state.get("api_key")
+    if stored:
+        return stored
+    key = configured_api_key()
     if not key and st.session_state.get("user_api_key"):
         key = st.session_state["user_api_key"]
     if key:
@@ -1391,36 +163,136 @@ def resolve_api_key() -> str | None:
     return key
 
 
+@st.cache_resource(show_spinner=False)
+def get_client_pool() -> ClientPool:
+    """Pool de clientes Gemini do processo, compartilhado por todas as sessões."""
+    return ClientPool()
+
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_pool() -> PrefetchPool:
+    """Buffer de Prática Mágica pronto, reabastecido em segundo plano."""
+    return PrefetchPool()
+
+
+@st.cache_resource(show_spinner=False)
+def get_exercise_cache() -> ExerciseCache:
+    """Conjuntos já gerados, em disco e compartilhados entre processos."""
+    return ExerciseCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_exercise_bank() -> ExerciseBank:
+    """Exercícios avulsos já gerados, deduplicados, para montar conjuntos sem chamar a IA."""
+    return ExerciseBank()
+
+
+@st.cache_resource(show_spinner=False)
+def get_local_generator() -> LocalGenerator:
+    """Gerador de exercícios sem rede, indexado a partir do currículo."""
+    return LocalGenerator(get_curriculum())
+
+
+@st.cache_resource(show_spinner=False)
+def get_lesson_grid() -> LessonGrid:
+    """Catálogo de cards do dashboard, montado uma vez a partir do currículo."""
+    return LessonGrid(get_curriculum())
+
+
+@st.cache_resource(show_spinner=False)
+def get_progress_store() -> ProgressStore:
+    """Progresso dos alunos em disco, gravado em lotes por uma thread de fundo."""
+    return ProgressStore()
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_sync() -> SessionSync | None:
+    """Estado das sessões no backend compartilhado (``SESSION_BACKEND``), ou ``None`` se desligado."""
+    backend = session_backend_factory()
+    return SessionSync(backend) if backend is not None else None
+
+
+@st.cache_resource(show_spinner=False)
+def get_tutor_cache() -> SemanticCache:
+    """Respostas do tutor reaproveitadas para perguntas quase iguais, por idioma."""
+    return SemanticCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_summary_folder() -> SummaryFolder:
+    """Resumos do chat atualizados em segundo plano, depois das respostas do tutor."""
+    return SummaryFolder()
+
+
+@st.cache_resource(show_spinner=False)
+def get_gateway() -> Gateway:
+    """Gateway único do processo: concorrência, rate limit, prioridades e coalescência."""
+    return Gateway()
+
+
+@st.cache_resource(show_spinner=False)
+def get_resilience() -> Resilience:
+    """Breakers, latências e contadores de retentativa compartilhados pelo processo."""
+    return Resilience(observer=get_model_ranker().record)
+
+
+@st.cache_resource(show_spinner=False)
+def get_model_ranker() -> ModelRanker:
+    """Ranking de modelos por latência e saúde, compartilhado por todas as sessões.
+
+    Sondas e saúde usam só a chave do servidor, nunca a de um aluno; sem ela,
+    vale a ordem dos candidatos.
+    """
+    key = configured_api_key() or default_api_key()
+    if not key or not backend_available():
+        return ModelRanker(gateway=get_gateway())
+    pool = get_client_pool()
+
+    def probe_client(name: str):
+        return pool.get_entry(key).client.for_model(name)
+
+    return ModelRanker(probe_client=probe_client, gateway=get_gateway(), fingerprint=key_fingerprint(key))
+
+
+@st.cache_resource(show_spinner=False)
+def get_run_timings() -> RunTimings:
+    """Tempos de execução do script por escopo (app inteiro e cada fragmento)."""
+    return RunTimings()
+
+
+@st.cache_resource(show_spinner=False)
+def get_practice_streams() -> dict:
+    """Streams de Prática Mágica em andamento, por ``stream_id`` da lição."""
+    return {}
+
+
 def ensure_gemini_model():
-    key = resolve_api_key()
-    if not key or genai is None:
+    key = resolve_api_key() or default_api_key()
+    if not key or not backend_available():
         return None
-    if st.session_state.get("model_key") != key or not st.session_state.get("gemini_model"):
-        genai.configure(api_key=key)
-        candidates = []
-        env_model = os.getenv("GEMINI_MODEL")
-        if env_model:
-            candidates.append(env_model)
-        candidates.extend(
-            [
-                "models/gemini-flash-latest",  # recomendação atual
-                "gemini-flash-latest",
-                "gemini-1.5-flash",
-                "gemini-1.5-pro",
-                "gemini-pro",
-            ]
-        )
-        model_instance = None
-        for name in candidates:
-            try:
-                model_instance = genai.GenerativeModel(name)
-                st.session_state["gemini_model_name"] = name
-                break
-            except Exception:
-                continue
-        st.session_state["gemini_model"] = model_instance
-        st.session_state["model_key"] = key
-    return st.session_state.get("gemini_model")
+    entry = get_client_pool().get_entry(key)
+    st.session_state["gemini_model_name"] = entry.model_name
+    return entry.client
+
+
+def uses_server_key() -> bool:
+    """A sessão usa a chave do servidor, e não uma chave pessoal do aluno."""
+    key = resolve_api_key() or default_api_key()
+    return key is not None and key == (configured_api_key() or default_api_key())
+
+
+def gateway_model(priority: int, workload: str | None = None, coalesce: bool = False):
+    """Cliente da sessão passando pelo gateway com a prioridade da chamada, com prazo, retentativas e breaker.
+
+    ``coalesce=True`` junta pedidos idênticos em andamento numa chamada só; use
+    apenas onde a mesma resposta serve a todos (nunca na geração de exercícios).
+    """
+    workload = workload or WORKLOADS[priority]
+    client = ensure_gemini_model()
+    if client is not None:
+        # modelo mais rápido e saudável para este tipo de carga
+        client = client.for_model(get_model_ranker().best(workload))
+    return get_resilience().wrap(get_gateway().bind(client, priority, coalesce), workload)
 
 
 def sidebar_controls():
@@ -1436,15 +308,17 @@ def sidebar_controls():
         )
         if user_input:
             st.session_state["user_api_key"] = user_input.strip()
-        key = resolve_api_key()
-        if genai is None:
+        key = resolve_api_key() or default_api_key()
+        if not backend_available():
             st.warning("Instale google-generativeai para usar os recursos de IA.")
+        elif key and get_resilience().breaker(key_fingerprint(key)).state == BREAKER_OPEN:
+            st.warning("Gemini instável; usando conteúdo salvo por enquanto.")
         elif key:
             st.success("Gemini pronto para uso.")
         else:
             st.info("Informe a chave para liberar IA.")
         if st.session_state.get("language"):
-            langs = list(CURRICULUM.keys())
+            langs = list(get_curriculum().languages)
             current_lang = st.session_state.get("language")
             selected_lang = st.selectbox(
                 "Idioma de estudo",
@@ -1467,6 +341,7 @@ def sidebar_controls():
                 st.session_state.arrange_pool = []
                 st.session_state.arrange_answer = []
                 st.session_state.view = "dashboard"
+                persist_progress()
                 st.rerun()
             st.markdown("---")
             st.markdown("#### Navegação")
@@ -1496,6 +371,49 @@ def sidebar_controls():
                 """,
                 unsafe_allow_html=True,
             )
+        if SHOW_RUN_TIMINGS:
+            for scope, stats in get_run_timings().summary().items():
+                st.caption(f"⏱️ {scope}: p50 {stats['p50_ms']} ms · p95 {stats['p95_ms']} ms ({stats['runs']} execuções)")
+            for line in diagnostics_lines():
+                st.caption(line)
+
+
+def diagnostics_lines() -> list:
+    """Contadores do gateway, resiliência, prefetch, cache, ranking e contexto do tutor, em uma linha cada."""
+    gateway = get_gateway().stats
+    resilience = get_resilience().snapshot()
+    prefetch = get_prefetch_pool().stats
+    cache = get_tutor_cache()
+    p95 = " · ".join(f"{workload} {value * 1000:.0f} ms" for workload, value in resilience["p95"].items() if value)
+    tripped = [
+        f"{key} {breaker['state']}" for key, breaker in resilience["breakers"].items() if breaker["state"] != BREAKER_CLOSED
+    ]
+    lines = [
+        f"🚦 gateway: fila {get_gateway().queue_size()} (máx. {gateway['max_queue']}) · {gateway['completed']} ok · "
+        f"{gateway['failed']} falhas · {gateway['coalesced']} coalescidas · {gateway['throttled']} limitadas",
+        f"🛡️ resiliência: {resilience['calls']} chamadas · {resilience['retries']} retentativas · "
+        f"{resilience['hedges']} hedges ({resilience['hedge_wins']} venceram) · {resilience['timeouts']} timeouts · "
+        f"{resilience['short_circuits']} cortadas pelo breaker",
+        f"🛡️ breakers: {', '.join(tripped) or 'todos fechados'}" + (f" · p95 {p95}" if p95 else ""),
+        f"📦 prefetch: {prefetch['hits']} acertos · {prefetch['misses']} faltas · {prefetch['refills']} repostos · "
+        f"{prefetch['failures']} falhas",
+        f"💬 cache do tutor: {cache.hit_rate():.0%} de acerto · {len(cache)} respostas · {cache.stats['vetoes']} vetadas",
+    ]
+    ranker = get_model_ranker()
+    if ranker.enabled:
+        unhealthy = [name for name, stats in ranker.snapshot().items() if not stats["healthy"]]
+        lines.append(
+            f"🏁 modelos: tutor {ranker.ranking('tutor')[0]} · prática {ranker.ranking('practice')[0]}"
+            + (f" · fora: {', '.join(unhealthy)}" if unhealthy else "")
+        )
+    metrics = st.session_state.get("tutor_context_metrics")
+    if metrics:
+        lines.append(
+            f"🧠 contexto do tutor: {metrics['total_tokens']}/{metrics['budget']} tokens · "
+            f"{metrics['messages_verbatim']} literais · {metrics['messages_folded']} resumidas · "
+            f"{metrics['messages_dropped']} fora"
+        )
+    return lines
 
 
 def get_profile(language: str) -> dict:
@@ -1503,35 +421,32 @@ def get_profile(language: str) -> dict:
     if language not in profiles:
         profiles[language] = {
             "xp": 0,
-            "completed_lessons": [],
+            "completed": "",
         }
-    return profiles[language]
+        persist_progress()
+    profile = profiles[language]
+    if "completed_lessons" in profile:
+        # perfil salvo antes do bitset: converte a lista de ids uma vez
+        bits = get_curriculum().completed_bits(profile.pop("completed_lessons"))
+        profile["completed"] = encode_bits(bits)
+        persist_progress()
+    stale = [lesson_id for lesson_id in profile.get("lesson_stats", ()) if lesson_id.startswith("ai-")]
+    if stale:
+        # uma entrada por lição gerada (id aleatório) de versões anteriores
+        for lesson_id in stale:
+            del profile["lesson_stats"][lesson_id]
+        persist_progress()
+    return profile
+
+
+def completed_bits(profile: dict) -> int:
+    """Lições concluídas do perfil como bitset (bit = slot da lição no currículo)."""
+    return decode_bits(profile["completed"])
 
 
 def award_xp(profile: dict, amount: int) -> None:
     profile["xp"] += amount
-
-
-def flatten_lessons(language: str):
-    lessons = []
-    for level, items in CURRICULUM[language].items():
-        for lesson in items:
-            lessons.append((level, lesson))
-    return lessons
-
-
-def is_unlocked(language: str, lesson_id: str, level: str) -> bool:
-    """Libera o primeiro exercício de cada nível e mantém sequência dentro do nível."""
-    profile = get_profile(language)
-    lessons_in_level = CURRICULUM[language][level]
-    ids = [l["id"] for l in lessons_in_level]
-    if lesson_id not in ids:
-        return False
-    idx = ids.index(lesson_id)
-    if idx == 0:
-        return True  # primeiro de cada nível fica desbloqueado
-    prev_id = ids[idx - 1]
-    return prev_id in profile["completed_lessons"]
+    persist_progress()
 
 
 def start_lesson(lesson: dict, level: str, source: str = "curriculum") -> None:
@@ -1543,6 +458,12 @@ def start_lesson(lesson: dict, level: str, source: str = "curriculum") -> None:
         "exercises": lesson["exercises"],
         "level": level,
         "source": source,
+        "stream_id": lesson.get("stream_id"),
+        # lição completa já conhecida: vai inteira para o navegador e volta como um resultado só
+        "offline": OFFLINE_LESSONS and component_available() and not lesson.get("stream_id"),
+        "run": uuid.uuid4().hex[:8],
+        # relógio do servidor (de parede: a sessão pode mudar de worker) para validar a lição offline
+        "started": time.time(),
     }
     st.session_state.current_exercise_index = 0
     st.session_state.arrange_pool = []
@@ -1558,9 +479,10 @@ def complete_lesson() -> None:
         st.session_state.view = "dashboard"
         return
     profile = get_profile(lang)
-    if lesson["source"] == "curriculum" and lesson["id"] not in profile["completed_lessons"]:
-        profile["completed_lessons"].append(lesson["id"])
+    if lesson["source"] == "curriculum":
+        profile["completed"] = encode_bits(get_curriculum().mark_completed(completed_bits(profile), lesson["id"]))
     xp_gain = XP_PER_EXERCISE * len(lesson["exercises"])
+    # award_xp já enfileira o perfil com a lição concluída e o XP juntos
     award_xp(profile, xp_gain)
     st.session_state.last_feedback = ("success", f"Lição concluída! +{xp_gain} XP")
     st.session_state.current_lesson = None
@@ -1568,7 +490,8 @@ def complete_lesson() -> None:
     st.session_state.arrange_pool = []
     st.session_state.arrange_answer = []
     st.session_state.view = "dashboard"
-    st.balloons()
+    # balões só aparecem em execução completa: quem chama pode ser callback ou fragmento
+    st.session_state.celebrate = True
 
 
 def render_feedback():
@@ -1588,32 +511,87 @@ def handle_correct_answer():
     st.session_state.current_exercise_index += 1
     st.session_state.arrange_pool = []
     st.session_state.arrange_answer = []
-    if st.session_state.current_exercise_index >= len(lesson["exercises"]):
+    index = st.session_state.current_exercise_index
+    if index >= len(lesson["exercises"]) and not practice_streaming(lesson):
         complete_lesson()
-        st.rerun()
+
+
+def grade_answer(exercise: dict, response) -> None:
+    if response == exercise["answer"]:
+        handle_correct_answer()
+    elif exercise["type"] == "arrange":
+        st.session_state.last_feedback = ("error", "Quase! Verifique a ordem das palavras.")
     else:
-        st.rerun()
+        st.session_state.last_feedback = ("error", "Resposta incorreta. Tente novamente.")
+
+
+def check_select(exercise: dict, key: str):
+    choice = st.session_state.get(key)
+    if choice is None:
+        st.session_state.last_feedback = ("error", "Escolha uma opção antes de verificar.")
+    else:
+        grade_answer(exercise, choice)
+
+
+def check_component(exercise: dict, key: str):
+    submitted = st.session_state.get(key)
+    if submitted:
+        grade_answer(exercise, submitted["response"])
+
+
+def expected_exercises(lesson: dict) -> list:
+    """Gabarito do lado do servidor: o currículo ou a lição gerada guardada na sessão."""
+    if lesson["source"] == "curriculum":
+        return get_curriculum().lesson(lesson["id"])["exercises"]
+    return lesson["exercises"]
+
+
+def apply_lesson_result(key: str):
+    lesson = st.session_state.current_lesson
+    payload = st.session_state.get(key)
+    if lesson is None or not payload:
+        return
+    try:
+        elapsed_ms = (time.time() - lesson.get("started", time.time())) * 1000
+        summary = validate_result(lesson["id"], expected_exercises(lesson), payload, elapsed_ms)
+    except LessonResultError:
+        st.session_state.last_feedback = ("error", "Não conseguimos validar a lição. Faça de novo, por favor.")
+        lesson["run"] = uuid.uuid4().hex[:8]  # componente novo, do zero
+        lesson["started"] = time.time()
+        return
+    stats = get_profile(st.session_state.language).setdefault("lesson_stats", {})
+    if lesson["source"] == "curriculum":
+        stats[lesson["id"]] = summary
+    else:
+        aggregate_stats(stats.setdefault(AI_LESSON_STATS, {}), lesson["exercises"], summary)
+    st.session_state.current_exercise_index = len(lesson["exercises"])
+    complete_lesson()
+
+
+def render_component_exercise(exercise: dict):
+    """Uma ida ao servidor por resposta: o exercício é montado e manipulado no navegador."""
+    key = f"exercise-{st.session_state.current_lesson['id']}-{st.session_state.current_exercise_index}"
+    exercise_component(exercise, key, on_submit=check_component, args=(exercise, key))
 
 
 def render_select_exercise(exercise: dict):
     key_prefix = f"{st.session_state.current_lesson['id']}-{st.session_state.current_exercise_index}"
     with st.form(key=f"form-{key_prefix}"):
         st.markdown(f"**{exercise['prompt']}**")
-        choice = st.radio(
+        st.radio(
             "Opções",
             options=exercise["options"],
             key=f"select-{key_prefix}",
             label_visibility="collapsed",
             index=None,
         )
-        submitted = st.form_submit_button("Verificar", type="primary", use_container_width=True)
-        if submitted:
-            if choice is None:
-                st.session_state.last_feedback = ("error", "Escolha uma opção antes de verificar.")
-            elif choice == exercise["answer"]:
-                handle_correct_answer()
-            else:
-                st.session_state.last_feedback = ("error", "Resposta incorreta. Tente novamente.")
+        st.form_submit_button(
+            "Verificar",
+            type="primary",
+            use_container_width=True,
+            on_click=check_select,
+            args=(exercise, f"select-{key_prefix}"),
+        )
 
 
 def prepare_arrange_state(exercise: dict):
@@ -1625,42 +603,71 @@ def prepare_arrange_state(exercise: dict):
         st.session_state.arrange_answer = []
 
 
+def move_arrange_word(source: str, target: str, idx: int):
+    word = st.session_state[source].pop(idx)
+    st.session_state[target].append(word)
+
+
+def reset_arrange(exercise: dict):
+    st.session_state.arrange_pool = exercise["words"].copy()
+    random.shuffle(st.session_state.arrange_pool)
+    st.session_state.arrange_answer = []
+
+
+def check_arrange(exercise: dict):
+    grade_answer(exercise, st.session_state.arrange_answer)
+
+
 def render_arrange_exercise(exercise: dict):
+    # os cliques só mexem no estado (callbacks); o fragmento da lição reroda sozinho
     prepare_arrange_state(exercise)
     key_prefix = st.session_state.arrange_key
     st.write(exercise["prompt"])
     pool_cols = st.columns(len(st.session_state.arrange_pool) or 1)
     for idx, word in enumerate(st.session_state.arrange_pool):
         col = pool_cols[idx % len(pool_cols)]
-        if col.button(word, key=f"pool-{key_prefix}-{idx}"):
-            st.session_state.arrange_answer.append(word)
-            st.session_state.arrange_pool.pop(idx)
-            st.rerun()
+        col.button(
+            word,
+            key=f"pool-{key_prefix}-{idx}",
+            on_click=move_arrange_word,
+            args=("arrange_pool", "arrange_answer", idx),
+        )
 
     st.markdown("**Sua frase:**")
     phrase_cols = st.columns(max(len(st.session_state.arrange_answer), 1))
     for idx, word in enumerate(st.session_state.arrange_answer):
         col = phrase_cols[idx % len(phrase_cols)]
-        if col.button(word, key=f"phrase-{key_prefix}-{idx}"):
-            st.session_state.arrange_pool.append(word)
-            st.session_state.arrange_answer.pop(idx)
-            st.rerun()
+        col.button(
+            word,
+            key=f"phrase-{key_prefix}-{idx}",
+            on_click=move_arrange_word,
+            args=("arrange_answer", "arrange_pool", idx),
+        )
 
     controls = st.columns(2)
-    if controls[0].button("Resetar frase", key=f"reset-{key_prefix}"):
-        st.session_state.arrange_pool = exercise["words"].copy()
-        random.shuffle(st.session_state.arrange_pool)
-        st.session_state.arrange_answer = []
-        st.rerun()
+    controls[0].button("Resetar frase", key=f"reset-{key_prefix}", on_click=reset_arrange, args=(exercise,))
+    controls[1].button(
+        "Verificar resposta",
+        key=f"verify-{key_prefix}",
+        type="primary",
+        on_click=check_arrange,
+        args=(exercise,),
+    )
 
-    if controls[1].button("Verificar resposta", key=f"verify-{key_prefix}", type="primary"):
-        if st.session_state.arrange_answer == exercise["answer"]:
-            handle_correct_answer()
-        else:
-            st.session_state.last_feedback = (
-                "error",
-                "Quase! Verifique a ordem das palavras.",
-            )
+
+def start_studying():
+    language = st.session_state["intro-language"]
+    st.session_state.language = language
+    get_profile(language)
+    if language not in st.session_state["chat_history"]:
+        st.session_state["chat_history"][language] = [
+            {
+                "role": "assistant",
+                "content": f"Olá! Sou seu tutor de {language}. Como posso ajudar hoje?",
+            }
+        ]
+    st.session_state.view = "dashboard"
+    persist_progress()
 
 
 def render_intro():
@@ -1668,32 +675,39 @@ def render_intro():
     with col2:
         st.title(f"🦜 {APP_NAME}")
         st.subheader("Seu tutor de idiomas estilo Duolingo, agora em Streamlit.")
-        language = st.selectbox("Escolha um idioma para praticar", list(CURRICULUM.keys()))
-        if st.button("Começar"):
-            st.session_state.language = language
-            get_profile(language)
-            if language not in st.session_state["chat_history"]:
-                st.session_state["chat_history"][language] = [
-                    {
-                        "role": "assistant",
-                        "content": f"Olá! Sou seu tutor de {language}. Como posso ajudar hoje?",
-                    }
-                ]
-            st.session_state.view = "dashboard"
-            st.rerun()
+        st.selectbox("Escolha um idioma para praticar", list(get_curriculum().languages), key="intro-language")
+        st.button("Começar", on_click=start_studying)
 
 
 def render_top_bar(lang: str, profile: dict):
-    col1, col2 = st.columns([1, 1])
+    col1, col2, col3 = st.columns([1, 1, 1])
     col1.metric("Idioma", f"{LANG_FLAGS.get(lang, '')} {lang}")
     col2.metric("XP", profile["xp"])
+    done = get_curriculum().completed_count(lang, completed_bits(profile))
+    col3.metric("Lições", f"{done}/{get_curriculum().lesson_count(lang)}")
+
+
+def start_from_grid(lang: str, key: str):
+    """Início vindo da grade: o estado é conferido de novo aqui, não no navegador."""
+    event = st.session_state.get(key) or {}
+    lesson = get_curriculum().lesson(event.get("lesson_id"))
+    if lesson is None or lesson["language"] != lang:
+        return
+    curriculum = get_curriculum()
+    bits = completed_bits(get_profile(lang))
+    if curriculum.is_completed(bits, lesson["id"]) or curriculum.is_unlocked(bits, lesson["id"]):
+        start_lesson(lesson, lesson["level"])
 
 
 def render_lessons(lang: str, profile: dict):
-    level_order = ["Básico", "Intermediário", "Avançado"]
+    statuses = get_curriculum().resolve_statuses(lang, completed_bits(profile))
+    if grid_available():
+        key = f"lesson-grid-{lang}"
+        get_lesson_grid().render(lang, statuses, key=key, on_start=start_from_grid, args=(lang, key))
+        return
     cols = st.columns(3)
-    for col, level in zip(cols, level_order):
-        lessons = CURRICULUM[lang].get(level, [])
+    for col, level in zip(cols, LEVEL_ORDER):
+        lessons = get_curriculum().lessons_in_level(lang, level)
         # garante até 6 slots por nível
         padded = lessons[:6] + [None] * max(0, 6 - len(lessons))
         with col:
@@ -1726,8 +740,9 @@ def render_lessons(lang: str, profile: dict):
                     )
                     continue
 
-                unlocked = is_unlocked(lang, lesson["id"], level)
-                completed = lesson["id"] in profile["completed_lessons"]
+                status = statuses[lesson["id"]]
+                completed = status == STATUS_DONE
+                unlocked = status != STATUS_LOCKED
                 status_text = "Concluída" if completed else ("Disponível" if unlocked else "Bloqueada")
                 status_class = "status-done" if completed else ("status-open" if unlocked else "status-locked")
                 if completed:
@@ -1764,91 +779,133 @@ def render_lessons(lang: str, profile: dict):
                 )
 
 
-def parse_ai_response(text: str):
-    cleaned = text.strip()
-    if cleaned.startswith("```"):
-        cleaned = cleaned.strip("`")
-        cleaned = cleaned.replace("json", "", 1).strip()
-    try:
-        data = json.loads(cleaned)
-    except json.JSONDecodeError:
+def ai_unavailable_reason() -> str | None:
+    """Motivo para nem tentar a IA agora: cota esgotada ou breaker aberto para a chave da sessão."""
+    key = resolve_api_key() or default_api_key()
+    if not key:
         return None
-    if not isinstance(data, list):
+    fingerprint = key_fingerprint(key)
+    resilience = get_resilience()
+    if resilience.quota_exhausted(fingerprint):
+        return "A cota da IA acabou por enquanto."
+    if resilience.breaker(fingerprint).state == BREAKER_OPEN:
+        return "A IA está instável agora."
+    return None
+
+
+def remember_practice(lang: str, xp: int, exercises: list) -> int:
+    """Guarda um conjunto gerado no cache de conjuntos e os exercícios no banco."""
+    get_exercise_bank().add(lang, xp, exercises)
+    return get_exercise_cache().put(lang, xp, exercises)
+
+
+def bank_practice(lang: str, xp: int):
+    """Conjunto montado do banco com exercícios que o aluno ainda não viu."""
+    seen = st.session_state["seen_bank_exercises"]
+    drawn = get_exercise_bank().draw(lang, xp, exclude=set(seen))
+    if not drawn:
         return None
-    normalized = []
-    for item in data:
-        if not isinstance(item, dict):
-            continue
-        if item.get("type") not in {"select", "arrange"}:
-            continue
-        if "prompt" not in item or "answer" not in item:
-            continue
-        if item["type"] == "select" and "options" in item:
-            options = item["options"]
-            if not isinstance(options, list) or len(options) < 2:
-                continue
-            if item["answer"] not in options:
-                continue
-            normalized.append(
-                {
-                    "type": "select",
-                    "prompt": item["prompt"],
-                    "options": options,
-                    "answer": item["answer"],
-                }
-            )
-        elif item["type"] == "arrange" and "words" in item:
-            words = item["words"]
-            if not isinstance(words, list) or len(words) < 2:
-                continue
-            normalized.append(
-                {
-                    "type": "arrange",
-                    "prompt": item["prompt"],
-                    "words": words,
-                    "answer": item["answer"],
-                }
-            )
-    return normalized or None
+    seen.extend(exercise_id for exercise_id, _ in drawn)
+    return [exercise for _, exercise in drawn]
 
 
 def generate_magic_practice(lang: str):
-    model = ensure_gemini_model()
-    if not model:
-        st.error("Configure a API key e um modelo Gemini válido (ex: models/gemini-flash-latest) para usar a prática mágica.")
-        return
     profile = get_profile(lang)
-    prompt = f"""
-    Gere 3 exercícios claros e completos para alunos de {lang} no estilo Duolingo.
-    Use apenas os tipos "select" e "arrange".
-    Regras:
-    - "select": prompt deve ter contexto (pergunta ou frase com ___), 3 a 4 opções, e "answer" deve ser exatamente uma das opções.
-    - "arrange": prompt deve pedir para montar uma frase; "words" são as palavras embaralhadas; "answer" é a lista na ordem correta.
-    Retorne SOMENTE JSON válido, sem markdown ou texto extra, seguindo o formato:
-    [
-      {{"type": "select", "prompt": "Complete: I ___ a teacher.", "options": ["am","is","are"], "answer": "am"}},
-      {{"type": "arrange", "prompt": "Monte: Eu estudo inglês à noite.", "words": ["estudo","Eu","noite","à","inglês"], "answer": ["Eu","estudo","inglês","à","noite"]}}
-    ]
-    Considere que o usuário tem {profile['xp']} XP para calibrar a dificuldade e traga instruções em uma frase completa.
-    """
-    with st.spinner("Gerando exercícios com Gemini..."):
-        try:
-            response = model.generate_content(prompt)
-            exercises = parse_ai_response(response.text)
-        except Exception as exc:  # pragma: no cover - rede/modelo externo
-            st.error(f"Não foi possível gerar exercícios: {exc}")
-            return
-    if not exercises:
-        st.error("Não entendi o retorno da IA. Tente novamente.")
-        return
+    xp = profile["xp"]
+    cache = get_exercise_cache()
+    seen = st.session_state["seen_practice_sets"]
+    notice = ai_unavailable_reason()
+    streaming = None
+    set_id = None
+    exercises = None
+    from_curriculum = False
+    if notice or get_exercise_bank().should_serve():
+        exercises = bank_practice(lang, xp)
+    if exercises is None and not notice and get_local_generator().should_serve():
+        exercises = get_local_generator().generate(lang, xp)
+        from_curriculum = exercises is not None
+    if exercises is None and not notice:
+        cached = cache.sample(lang, xp, exclude=set(seen))
+        if cached:
+            set_id, exercises = cached
+    if exercises is None and not notice:
+        model = gateway_model(PRIORITY_PRACTICE)
+        if not model:
+            notice = "Configure a API key e um modelo Gemini válido (ex: models/gemini-flash-latest) para exercícios da IA."
+        else:
+            exercises = get_prefetch_pool().pop(gateway_model(PRIORITY_PREFETCH), lang, xp)
+        if exercises is not None:
+            set_id = remember_practice(lang, xp, exercises)
+        elif model:
+            streaming = PracticeStream(
+                stream_exercises(model, lang, xp),
+                on_complete=lambda items: remember_practice(lang, xp, items),
+            )
+            # só espera o primeiro exercício válido; o resto chega com a lição aberta
+            with st.spinner("Gerando exercícios com Gemini..."):
+                streaming.first()
+            if streaming.exercises:
+                exercises = streaming.exercises
+            else:
+                notice = ai_unavailable_reason() or (
+                    f"Não foi possível gerar exercícios: {streaming.error}"
+                    if streaming.error is not None else "Não entendi o retorno da IA."
+                )
+                streaming = None
+    if exercises is None:
+        # plano B: inéditos do banco, depois o gerador local e, por último, um conjunto salvo já visto
+        exercises = bank_practice(lang, xp)
+        if exercises is None:
+            exercises = get_local_generator().generate(lang, xp)
+            from_curriculum = exercises is not None
+        if exercises is None:
+            fallback = cache.sample(lang, xp)
+            if not fallback:
+                st.error(notice or "Não entendi o retorno da IA. Tente novamente.")
+                return
+            set_id, exercises = fallback
+    if notice:
+        origin = "montados a partir do currículo" if from_curriculum else "já gerados"
+        notice = f"{notice} Usando exercícios {origin}."
+    if set_id is not None:
+        seen.append(set_id)
     lesson = {
         "id": f"ai-{random.randint(1000, 9999)}",
         "title": "Prática Mágica",
         "icon": "✨",
-        "description": "Exercícios criados pela IA agora mesmo.",
+        "description": (
+            "Exercícios novos montados a partir das frases do currículo."
+            if from_curriculum else "Exercícios criados pela IA agora mesmo."
+        ),
         "exercises": exercises,
     }
+    if streaming is not None:
+        streams = get_practice_streams()
+        for stream_id in [key for key, stream in streams.items() if stream.done]:
+            streams.pop(stream_id, None)
+        lesson["stream_id"] = uuid.uuid4().hex
+        streams[lesson["stream_id"]] = streaming
     start_lesson(lesson, level="IA", source="ai")
+    if notice:
+        st.session_state.last_feedback = ("error", notice)
+
+
+def practice_stream(lesson: dict):
+    stream_id = lesson.get("stream_id")
+    return get_practice_streams().get(stream_id) if stream_id else None
+
+
+def practice_streaming(lesson: dict) -> bool:
+    """A Prática Mágica ainda está recebendo exercícios do modelo."""
+    stream = practice_stream(lesson)
+    return stream is not None and not stream.done
+
+
+def finish_practice_stream(lesson: dict) -> None:
+    stream = get_practice_streams().pop(lesson.get("stream_id"), None)
+    lesson["stream_id"] = None
+    if stream is not None and stream.result is not None:
+        st.session_state["seen_practice_sets"].append(stream.result)
 
 
 def render_dashboard():
@@ -1866,6 +923,9 @@ def render_dashboard():
         magic_cols = st.columns([2, 1])
         magic_cols[0].write("Gere exercícios personalizados com IA.")
         magic_cols[1].button("✨ Prática Mágica", on_click=generate_magic_practice, args=(lang,))
+        if uses_server_key():
+            # deixa o próximo clique pronto sem bloquear este rerun; chave pessoal só repõe o que usar
+            get_prefetch_pool().fill(gateway_model(PRIORITY_PREFETCH), lang, profile["xp"])
 
         st.markdown("### Lições")
         render_lessons(lang, profile)
@@ -1880,6 +940,12 @@ def render_progress(lesson: dict):
     st.progress(idx / total, text=f"Progresso: {idx}/{total}")
 
 
+def follow_navigation(view: str) -> None:
+    """Dentro de um fragmento: se a interação trocou de tela, roda o app inteiro."""
+    if st.session_state.view != view:
+        st.rerun()
+
+
 def render_lesson():
     lang = st.session_state.get("language")
     lesson = st.session_state.get("current_lesson")
@@ -1890,94 +956,248 @@ def render_lesson():
     with col2:
         st.title(f"{lesson['icon']} {lesson['title']}")
         st.caption(f"{lesson['description']} · {lesson['level']}")
-        render_progress(lesson)
-        render_feedback()
-        if st.button("Voltar ao dashboard"):
-            st.session_state.view = "dashboard"
+        st.button("Voltar ao dashboard", on_click=lambda: st.session_state.update(view="dashboard"))
+        lesson_fragment()
+
+
+@st.fragment
+def lesson_fragment():
+    """Progresso e exercício atual; cliques nos exercícios reexecutam só este trecho."""
+    with get_run_timings().measure("lesson"), session_synced():
+        follow_navigation("lesson")
+        lesson = st.session_state.current_lesson
+        if lesson.get("offline"):
+            render_feedback()
+            key = f"lesson-{lesson['id']}-{lesson['run']}"
+            lesson_component(lesson, key, on_complete=apply_lesson_result, args=(key,))
             return
         idx = st.session_state.current_exercise_index
+        stream = practice_stream(lesson)
+        if stream is not None:
+            if idx >= len(lesson["exercises"]) and not stream.done:
+                with st.spinner("Carregando o próximo exercício..."):
+                    stream.wait_for(idx + 1, PRACTICE_STREAM_WAIT)
+            if stream.done:
+                finish_practice_stream(lesson)
         if idx >= len(lesson["exercises"]):
             complete_lesson()
-            return
+            st.rerun()
+        render_progress(lesson)
+        render_feedback()
         exercise = lesson["exercises"][idx]
-        if exercise["type"] == "select":
+        if component_available():
+            render_component_exercise(exercise)
+        elif exercise["type"] == "select":
             render_select_exercise(exercise)
         elif exercise["type"] == "arrange":
             render_arrange_exercise(exercise)
 
 
-def ask_tutor(prompt: str, lang: str) -> str:
-    model = ensure_gemini_model()
-    if not model:
-        return "Configure a API key e defina um modelo Gemini válido (ex: models/gemini-flash-latest)."
+def tutor_contents(prompt: str, lang: str) -> list:
+    """Conversa recente + resumo das antigas, dentro do orçamento de tokens; não espera resumo novo."""
     system = (
         f"Você é um tutor nativo de {lang}. "
         "Corrija suavemente erros, incentive e responda de forma curta."
     )
+    history = st.session_state["chat_history"].get(lang, [])
+    if history and history[-1] == {"role": "user", "content": prompt}:
+        history = history[:-1]
+    state = st.session_state["tutor_context"].setdefault(lang, new_context_state())
+    contents, metrics = build_context(system, history, prompt, state)
+    st.session_state["tutor_context_metrics"] = metrics
+    return contents
+
+
+def cacheable_turn(prompt: str, lang: str) -> bool:
+    """Só a primeira pergunta, sem histórico nem resumo, usa o cache (compartilhado entre alunos).
+
+    A saudação fixa do tutor não conta como histórico: não depende do aluno.
+    """
+    history = st.session_state["chat_history"].get(lang, [])
+    if history and history[-1] == {"role": "user", "content": prompt}:
+        history = history[:-1]
+    state = st.session_state["tutor_context"].get(lang) or {}
+    return not any(message["role"] == "user" for message in history) and not state.get("summary")
+
+
+def schedule_summary(lang: str) -> None:
+    """Depois da resposta: dobra as mensagens antigas no resumo em segundo plano."""
+    history = st.session_state["chat_history"].get(lang, [])
+    state = st.session_state["tutor_context"].setdefault(lang, new_context_state())
+    model = gateway_model(PRIORITY_PREFETCH, SUMMARY_WORKLOAD)
+    summarize = model_summarizer(model) if model else extractive_summary
+    get_summary_folder().schedule(state, history, summarize)
+
+
+def ask_tutor(prompt: str, lang: str) -> str:
+    cacheable = cacheable_turn(prompt, lang)
+    cached = get_tutor_cache().lookup(lang, prompt) if cacheable else None
+    if cached:
+        return cached
+    # mesma conversa e mesma pergunta: a resposta serve para todos os pedidos iguais em andamento
+    model = gateway_model(PRIORITY_INTERACTIVE, coalesce=True)
+    if not model:
+        return "Configure a API key e defina um modelo Gemini válido (ex: models/gemini-flash-latest)."
     try:
-        response = model.generate_content(
-            [
-                {"role": "user", "parts": system},
-                {"role": "user", "parts": prompt},
-            ]
-        )
+        response = model.generate_content(tutor_contents(prompt, lang))
+        if cacheable:
+            get_tutor_cache().store(lang, prompt, response.text)
         return response.text
+    except CircuitOpenError:
+        return TUTOR_UNAVAILABLE
     except Exception as exc:  # pragma: no cover - rede/modelo externo
         return f"Não consegui responder agora: {exc}"
 
 
+def stream_tutor(prompt: str, lang: str):
+    """Versão em streaming de ``ask_tutor``: devolve os pedaços da resposta conforme chegam."""
+    cacheable = cacheable_turn(prompt, lang)
+    cached = get_tutor_cache().lookup(lang, prompt) if cacheable else None
+    if cached:
+        yield cached
+        return
+    model = gateway_model(PRIORITY_INTERACTIVE)
+    if not model:
+        yield "Configure a API key e defina um modelo Gemini válido (ex: models/gemini-flash-latest)."
+        return
+    started = time.perf_counter()
+    first = True
+    parts = []
+    try:
+        response = model.generate_content(tutor_contents(prompt, lang), stream=True)
+        for chunk in response:
+            text = chunk.text
+            if not text:
+                continue
+            if first:
+                # tempo até o primeiro token, para acompanhar a latência percebida
+                st.session_state["tutor_ttft"] = time.perf_counter() - started
+                first = False
+            parts.append(text)
+            yield text
+        # só guarda respostas completas; GeneratorExit (navegação) não passa por aqui
+        if cacheable:
+            get_tutor_cache().store(lang, prompt, "".join(parts))
+    except CircuitOpenError:
+        yield TUTOR_UNAVAILABLE
+    except Exception as exc:  # pragma: no cover - rede/modelo externo
+        yield f"Não consegui responder agora: {exc}"
+
+
 def render_chat():
     lang = st.session_state.get("language")
     if not lang:
         st.session_state.view = "intro"
         return
-    history = st.session_state["chat_history"].setdefault(
-        lang,
-        [
-            {
-                "role": "assistant",
-                "content": f"Olá! Sou seu tutor de {lang}. Como posso ajudar hoje?",
-            }
-        ],
-    )
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         st.title(f"Tutor IA · {LANG_FLAGS.get(lang, '')} {lang}")
         st.caption("Converse com um professor nativo e receba correções gentis.")
-        if st.button("Voltar ao dashboard"):
-            st.session_state.view = "dashboard"
-            st.rerun()
-            return
-        for message in history:
+        st.button("Voltar ao dashboard", on_click=lambda: st.session_state.update(view="dashboard"))
+        chat_fragment()
+
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]<>()#+\-.!|~])")
+
+
+@lru_cache(maxsize=4096)
+def message_markdown(role: str, content: str) -> str:
+    """Markdown de uma mensagem já enviada, memoizado pelo conteúdo.
+
+    Texto do aluno aparece literal; ``$`` não vira fórmula em nenhum dos dois lados.
+    """
+    if role == "user":
+        content = _MARKDOWN_SPECIAL.sub(r"\\\1", content)
+    return content.replace("$", "\\$")
+
+
+def load_earlier_messages(lang: str) -> None:
+    windows = st.session_state["chat_window"]
+    windows[lang] = windows.get(lang, CHAT_PAGE_SIZE) + CHAT_PAGE_SIZE
+
+
+@st.fragment
+def chat_fragment():
+    """Histórico e caixa de mensagem; enviar uma pergunta reexecuta só este trecho."""
+    with get_run_timings().measure("chat"), session_synced():
+        follow_navigation("chat")
+        lang = st.session_state["language"]
+        history = st.session_state["chat_history"].setdefault(
+            lang,
+            [
+                {
+                    "role": "assistant",
+                    "content": f"Olá! Sou seu tutor de {lang}. Como posso ajudar hoje?",
+                }
+            ],
+        )
+        window = st.session_state["chat_window"].get(lang, CHAT_PAGE_SIZE)
+        hidden = max(0, len(history) - window)
+        if hidden:
+            st.button(
+                f"Carregar mensagens anteriores ({hidden})",
+                key=f"chat-earlier-{lang}",
+                on_click=load_earlier_messages,
+                args=(lang,),
+            )
+        for message in history[hidden:]:
             with st.chat_message(message["role"]):
-                st.write(message["content"])
+                st.markdown(message_markdown(message["role"], message["content"]))
         user_input = st.chat_input("Digite sua mensagem")
         if user_input:
             history.append({"role": "user", "content": user_input})
             with st.chat_message("user"):
-                st.write(user_input)
-            with st.spinner("Tutor digitando..."):
-                reply = ask_tutor(user_input, lang)
-            history.append({"role": "assistant", "content": reply})
-            with st.chat_message("assistant"):
-                st.write(reply)
+                st.markdown(message_markdown("user", user_input))
+            if not TUTOR_STREAMING:
+                with st.spinner("Tutor digitando..."):
+                    reply = ask_tutor(user_input, lang)
+                history.append({"role": "assistant", "content": reply})
+                persist_progress(chat=True)
+                schedule_summary(lang)
+                with st.chat_message("assistant"):
+                    st.markdown(message_markdown("assistant", reply))
+                return
+            received = []
+            chunks = stream_tutor(user_input, lang)
+
+            def relay():
+                for text in chunks:
+                    received.append(text)
+                    yield text
+
+            try:
+                with st.chat_message("assistant"):
+                    st.write_stream(relay())
+            finally:
+                # se o usuário sair no meio, o rerun interrompe o write_stream:
+                # fecha o stream do modelo e guarda o que já tinha chegado
+                chunks.close()
+                if received:
+                    history.append({"role": "assistant", "content": "".join(received)})
+                persist_progress(chat=True)
+                schedule_summary(lang)
 
 
 def main():
-    inject_css()
-    init_session_state()
-    sidebar_controls()
-    view = st.session_state.view
-    if view == "intro":
-        render_intro()
-    elif view == "dashboard":
-        render_dashboard()
-    elif view == "lesson":
-        render_lesson()
-    elif view == "chat":
-        render_chat()
-    else:
-        render_intro()
+    with get_run_timings().measure("app"), session_synced():
+        inject_css()
+        init_session_state()
+        resume_progress()
+        sidebar_controls()
+        view = st.session_state.view
+        if view == "intro":
+            render_intro()
+        elif view == "dashboard":
+            render_dashboard()
+        elif view == "lesson":
+            render_lesson()
+        elif view == "chat":
+            render_chat()
+        else:
+            render_intro()
+        if st.session_state.celebrate:
+            st.session_state.celebrate = False
+            st.balloons()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,37 @@
+"""Shim do protocolo de componentes do Streamlit, comum a todos os componentes.
+
+O Streamlit só serve arquivos de dentro da pasta de cada componente (links
+simbólicos para fora são recusados), então ``components/streamlit_protocol.js``
+é copiado para a pasta de cada um na importação e o ``index.html`` carrega a
+cópia local.
+"""
+
+import os
+
+COMPONENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components")
+PROTOCOL_FILE = "streamlit_protocol.js"
+PROTOCOL_SOURCE = os.path.join(COMPONENTS_DIR, PROTOCOL_FILE)
+
+
+def install_protocol(directory: str) -> bool:
+    """Copia o shim para ``directory`` se faltar ou estiver velho; ``False`` se não der para gravar."""
+    try:
+        with open(PROTOCOL_SOURCE, "rb") as handle:
+            raw = handle.read()
+    except OSError:
+        return False
+    path = os.path.join(directory, PROTOCOL_FILE)
+    try:
+        with open(path, "rb") as handle:
+            if handle.read() == raw:
+                return True
+    except OSError:
+        pass
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(raw)
+        os.replace(tmp_path, path)
+    except OSError:
+        return False
+    return True
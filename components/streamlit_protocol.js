@@ -0,0 +1,26 @@
+// Protocolo de componentes do Streamlit sem build: mensagens via postMessage.
+// Fonte única para todos os componentes; component_protocol.py copia este
+// arquivo para a pasta de cada um e o index.html carrega a cópia local.
+const Streamlit = {
+  send(type, data) {
+    window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type }, data), "*");
+  },
+
+  setFrameHeight(height) {
+    Streamlit.send("streamlit:setFrameHeight", { height: height === undefined ? document.body.scrollHeight + 8 : height });
+  },
+
+  setComponentValue(value) {
+    Streamlit.send("streamlit:setComponentValue", { value, dataType: "json" });
+  },
+
+  // callback(args) a cada rerun do servidor; depois avisa que o componente está pronto
+  onRender(callback) {
+    window.addEventListener("message", (event) => {
+      if (event.data && event.data.type === "streamlit:render") {
+        callback(event.data.args);
+      }
+    });
+    Streamlit.send("streamlit:componentReady", { apiVersion: 1 });
+  },
+};
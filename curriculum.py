@@ -0,0 +1,264 @@
+"""Compilação e carregamento do currículo.
+
+O conteúdo fica em ``content/curriculum.json`` (editado pela equipe de
+conteúdo). ``python curriculum.py`` compila esse arquivo em um pacote
+indexado (``content/curriculum.pack.json``) que o app carrega uma única vez
+por processo.
+
+Lições concluídas são um bitset por idioma. O bit de cada lição vem de
+``content/lesson_slots.json``, que só cresce: lição nova ganha o próximo
+slot, lição removida mantém o dela, então reordenar ou inserir lições não
+muda o progresso salvo dos alunos.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+SOURCE_PATH = os.path.join(CONTENT_DIR, "curriculum.json")
+PACK_PATH = os.path.join(CONTENT_DIR, "curriculum.pack.json")
+SLOTS_PATH = os.path.join(CONTENT_DIR, "lesson_slots.json")
+PACK_VERSION = 3
+
+STATUS_LOCKED = "locked"
+STATUS_OPEN = "open"
+STATUS_DONE = "done"
+
+
+def _source_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def encode_bits(bits: int) -> str:
+    """Forma serializada do bitset: base64 urlsafe dos bytes little-endian, sem padding."""
+    if bits <= 0:
+        return ""
+    raw = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_bits(text: str) -> int:
+    if not text:
+        return 0
+    raw = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+    return int.from_bytes(raw, "little")
+
+
+def assign_slots(source: dict, slots: dict | None = None) -> dict:
+    """Estende a tabela ``idioma -> [ids]`` com as lições novas, sem mexer nas existentes."""
+    assigned = {language: list(ids) for language, ids in (slots or {}).items()}
+    for language, language_levels in source.items():
+        ids = assigned.setdefault(language, [])
+        known = set(ids)
+        for items in language_levels.values():
+            for lesson in items:
+                if lesson["id"] not in known:
+                    ids.append(lesson["id"])
+                    known.add(lesson["id"])
+    return assigned
+
+
+def compile_curriculum(source: dict, source_hash: str = "", slots: dict | None = None) -> dict:
+    """Gera o pacote indexado: id -> lição, nível -> ids ordenados, pré-requisitos e slots do bitset.
+
+    Cada lição pode declarar ``requires`` (lista de ids, inclusive de outros
+    níveis); sem isso, vale a regra antiga: depende da anterior no mesmo nível.
+    """
+    lessons = {}
+    levels = {}
+    prerequisites = {}
+    for language, language_levels in source.items():
+        levels[language] = {}
+        for level, items in language_levels.items():
+            ids = []
+            for lesson in items:
+                lesson_id = lesson["id"]
+                if lesson_id in lessons:
+                    raise ValueError(f"Lição duplicada no currículo: {lesson_id}")
+                lessons[lesson_id] = dict(lesson, language=language, level=level)
+                if "requires" in lesson:
+                    prerequisites[lesson_id] = list(lesson["requires"])
+                else:
+                    prerequisites[lesson_id] = [ids[-1]] if ids else []
+                ids.append(lesson_id)
+            levels[language][level] = ids
+    _check_prerequisites(lessons, prerequisites)
+    return {
+        "version": PACK_VERSION,
+        "source_hash": source_hash,
+        "languages": list(source.keys()),
+        "levels": levels,
+        "lessons": lessons,
+        "prerequisites": prerequisites,
+        "slots": assign_slots(source, slots),
+    }
+
+
+def _check_prerequisites(lessons: dict, prerequisites: dict) -> None:
+    for lesson_id, parents in prerequisites.items():
+        for parent in parents:
+            if parent not in lessons:
+                raise ValueError(f"Pré-requisito desconhecido em {lesson_id}: {parent}")
+            if lessons[parent]["language"] != lessons[lesson_id]["language"]:
+                raise ValueError(f"Pré-requisito de outro idioma em {lesson_id}: {parent}")
+    # DFS iterativa para rejeitar ciclos (lição que nunca seria liberada)
+    state = {}
+    for root in prerequisites:
+        if root in state:
+            continue
+        stack = [(root, iter(prerequisites[root]))]
+        state[root] = "visiting"
+        while stack:
+            node, parents = stack[-1]
+            parent = next(parents, None)
+            if parent is None:
+                state[node] = "visited"
+                stack.pop()
+            elif state.get(parent) == "visiting":
+                raise ValueError(f"Ciclo de pré-requisitos envolvendo {parent}")
+            elif parent not in state:
+                state[parent] = "visiting"
+                stack.append((parent, iter(prerequisites[parent])))
+
+
+class CurriculumPack:
+    """Visão somente leitura do pacote compilado, compartilhada entre sessões."""
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.languages = data["languages"]
+        self._levels = data["levels"]
+        self._lessons = data["lessons"]
+        self._language_ids = {
+            language: [lesson_id for ids in levels.values() for lesson_id in ids]
+            for language, levels in self._levels.items()
+        }
+        self._slots = {
+            lesson_id: slot for ids in data["slots"].values() for slot, lesson_id in enumerate(ids)
+        }
+        # máscaras pré-calculadas: lições atuais do idioma e pré-requisitos de cada lição
+        self._active = {
+            language: sum(1 << self._slots[lesson_id] for lesson_id in ids)
+            for language, ids in self._language_ids.items()
+        }
+        self._requires = {
+            lesson_id: sum(1 << self._slots[parent] for parent in parents)
+            for lesson_id, parents in data["prerequisites"].items()
+        }
+
+    def levels(self, language: str) -> list:
+        return list(self._levels.get(language, {}).keys())
+
+    def lesson_ids(self, language: str, level: str) -> list:
+        return self._levels.get(language, {}).get(level, [])
+
+    def lessons_in_level(self, language: str, level: str) -> list:
+        return [self._lessons[lesson_id] for lesson_id in self.lesson_ids(language, level)]
+
+    def lesson(self, lesson_id: str) -> dict | None:
+        return self._lessons.get(lesson_id)
+
+    def completed_bits(self, lesson_ids) -> int:
+        """Bitset a partir de uma lista de ids (perfis antigos); ids desconhecidos são ignorados."""
+        return sum(1 << self._slots[lesson_id] for lesson_id in set(lesson_ids) if lesson_id in self._slots)
+
+    def is_completed(self, bits: int, lesson_id: str) -> bool:
+        slot = self._slots.get(lesson_id)
+        return slot is not None and bool(bits >> slot & 1)
+
+    def mark_completed(self, bits: int, lesson_id: str) -> int:
+        return bits | (1 << self._slots[lesson_id])
+
+    def completed_count(self, language: str, bits: int) -> int:
+        """Lições atuais do idioma concluídas (slots de lições removidas não contam)."""
+        return (bits & self._active.get(language, 0)).bit_count()
+
+    def lesson_count(self, language: str) -> int:
+        return len(self._language_ids.get(language, []))
+
+    def is_unlocked(self, bits: int, lesson_id: str) -> bool:
+        required = self._requires[lesson_id]
+        return bits & required == required
+
+    def resolve_statuses(self, language: str, bits: int) -> dict:
+        """Estado (locked/open/done) de todas as lições do idioma em uma passada sobre o bitset."""
+        statuses = {}
+        for lesson_id in self._language_ids.get(language, []):
+            if bits >> self._slots[lesson_id] & 1:
+                statuses[lesson_id] = STATUS_DONE
+            elif bits & self._requires[lesson_id] == self._requires[lesson_id]:
+                statuses[lesson_id] = STATUS_OPEN
+            else:
+                statuses[lesson_id] = STATUS_LOCKED
+        return statuses
+
+    def flatten(self, language: str) -> list:
+        return [
+            (level, self._lessons[lesson_id])
+            for level, ids in self._levels.get(language, {}).items()
+            for lesson_id in ids
+        ]
+
+
+def _read_slots(slots_path: str):
+    try:
+        with open(slots_path, "rb") as handle:
+            raw = handle.read()
+    except OSError:
+        return {}, b""
+    return json.loads(raw), raw
+
+
+def _write_json(path: str, data, **options) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, ensure_ascii=False, **options)
+    os.replace(tmp_path, path)
+
+
+def build_pack(source_path: str = SOURCE_PATH, pack_path: str = PACK_PATH, slots_path: str = SLOTS_PATH) -> dict:
+    """Compila o pacote e grava a tabela de slots estendida (versione ``lesson_slots.json``)."""
+    with open(source_path, "rb") as handle:
+        raw = handle.read()
+    slots, slots_raw = _read_slots(slots_path)
+    pack = compile_curriculum(json.loads(raw), "", slots)
+    if pack["slots"] != slots:
+        _write_json(slots_path, pack["slots"], indent=2)
+        slots, slots_raw = _read_slots(slots_path)
+    pack["source_hash"] = _source_hash(raw + slots_raw)
+    _write_json(pack_path, pack, separators=(",", ":"))
+    return pack
+
+
+def load_pack(source_path: str = SOURCE_PATH, pack_path: str = PACK_PATH, slots_path: str = SLOTS_PATH) -> CurriculumPack:
+    """Lê o pacote compilado; recompila em memória se ele, o conteúdo ou os slots estiverem desatualizados."""
+    with open(source_path, "rb") as handle:
+        raw = handle.read()
+    slots, slots_raw = _read_slots(slots_path)
+    expected = _source_hash(raw + slots_raw)
+    try:
+        with open(pack_path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        if data.get("version") == PACK_VERSION and data.get("source_hash") == expected:
+            return CurriculumPack(data)
+    except (OSError, json.JSONDecodeError):
+        pass
+    data = compile_curriculum(json.loads(raw), expected, slots)
+    if data["slots"] != slots:
+        # conteúdo editado sem rodar ``python curriculum.py``: fixa os slots novos para
+        # que a próxima edição não os desloque (sem escrita, seguem valendo em memória)
+        try:
+            _write_json(slots_path, data["slots"], indent=2)
+        except OSError:
+            pass
+    return CurriculumPack(data)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else PACK_PATH
+    built = build_pack(source, target)
+    print(f"{len(built['lessons'])} lições compiladas em {target}")
@@ -0,0 +1,180 @@
+"""Banco local de exercícios gerados pela IA.
+
+Cada exercício validado entra uma vez só (deduplicado por enunciado e
+resposta normalizados), com idioma, faixa de XP, dificuldade estimada e o
+prompt que o gerou. A Prática Mágica monta conjuntos a partir do banco quando
+a cota acaba, quando o circuit breaker está aberto ou em uma fração
+configurável dos pedidos.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from practice import XP_BAND_SIZE, build_practice_prompt, xp_band
+
+BANK_PATH = os.getenv(
+    "EXERCISE_BANK_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "exercise_bank.sqlite3"),
+)
+BANK_MAX_ITEMS = int(os.getenv("EXERCISE_BANK_MAX", "20000"))
+# fração dos pedidos de Prática Mágica atendida pelo banco mesmo com a IA no ar
+BANK_SERVE_RATIO = float(os.getenv("EXERCISE_BANK_RATIO", "0.25"))
+BANK_SET_SIZE = 3
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", str(text)).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def dedupe_key(lang: str, exercise: dict) -> str:
+    answer = exercise["answer"]
+    if isinstance(answer, list):
+        answer = " ".join(str(word) for word in answer)
+    raw = "|".join((normalize_text(lang), exercise["type"], normalize_text(exercise["prompt"]), normalize_text(answer)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def estimate_difficulty(exercise: dict) -> int:
+    """Nota de 1 a 5 pelo tamanho da frase e pelo número de alternativas."""
+    if exercise["type"] == "arrange":
+        size = len(exercise["words"])
+    else:
+        size = len(str(exercise["prompt"]).split()) // 2 + len(exercise["options"])
+    return max(1, min(5, (size - 1) // 2))
+
+
+class ExerciseBank:
+    """Exercícios individuais em SQLite (modo WAL), compartilhados pelos processos da máquina."""
+
+    def __init__(self, path: str = BANK_PATH, max_items: int = BANK_MAX_ITEMS,
+                 serve_ratio: float = BANK_SERVE_RATIO, clock=time.time):
+        self.path = path
+        self.max_items = max_items
+        self.serve_ratio = serve_ratio
+        self._clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS source_prompts (
+                    hash TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS exercises (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key TEXT NOT NULL UNIQUE,
+                    language TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    difficulty INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    source_prompt TEXT NOT NULL REFERENCES source_prompts (hash),
+                    created REAL NOT NULL,
+                    served INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bank_language ON exercises (language, band)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, lang: str, xp: int, exercises: list) -> int:
+        """Guarda os exercícios ainda inéditos; devolve quantos entraram."""
+        prompt = build_practice_prompt(lang, xp)
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        rows = [
+            (dedupe_key(lang, exercise), lang, xp_band(xp), estimate_difficulty(exercise),
+             json.dumps(exercise, ensure_ascii=False), prompt_hash, self._clock())
+            for exercise in exercises
+        ]
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO source_prompts (hash, prompt) VALUES (?, ?)", (prompt_hash, prompt))
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO exercises
+                    (dedupe_key, language, band, difficulty, payload, source_prompt, created)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            added = conn.total_changes - before
+            if added:
+                self._evict(conn)
+        return added
+
+    def should_serve(self) -> bool:
+        """Sorteio da fração configurada de pedidos atendidos pelo banco."""
+        return self.serve_ratio > 0 and random.random() < self.serve_ratio
+
+    def draw(self, lang: str, xp: int, count: int = BANK_SET_SIZE, exclude=()):
+        """Monta um conjunto da faixa mais próxima, do mais fácil ao mais difícil.
+
+        Devolve ``[(id, exercício), ...]`` ou ``None`` se não houver ``count``
+        exercícios inéditos para o aluno; os menos servidos têm preferência.
+        """
+        band = xp_band(xp)
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, difficulty, payload FROM exercises
+                WHERE language = ? AND band <= ?
+                ORDER BY ABS(band - ?), served, RANDOM()
+                LIMIT ?
+                """,
+                (lang, band + XP_BAND_SIZE, band, count + len(exclude)),
+            ).fetchall()
+            picked = [row for row in rows if row[0] not in exclude][:count]
+            if len(picked) < count:
+                return None
+            conn.executemany("UPDATE exercises SET served = served + 1 WHERE id = ?", [(row[0],) for row in picked])
+        picked.sort(key=lambda row: row[1])
+        return [(row[0], json.loads(row[2])) for row in picked]
+
+    def source_prompt(self, exercise_id: int) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT source_prompts.prompt FROM exercises
+                JOIN source_prompts ON source_prompts.hash = exercises.source_prompt
+                WHERE exercises.id = ?
+                """,
+                (exercise_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM exercises").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # o banco só cresce até o limite; sai primeiro o que já foi mais servido
+        conn.execute(
+            """
+            DELETE FROM exercises WHERE id IN (
+                SELECT id FROM exercises ORDER BY served ASC, created DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_items,),
+        )
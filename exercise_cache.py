@@ -0,0 +1,111 @@
+"""Cache em disco dos conjuntos de exercícios gerados pela IA.
+
+Fica em um arquivo SQLite (modo WAL) para sobreviver a reinícios e ser
+compartilhado por todos os processos do servidor na mesma máquina.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from practice import PRACTICE_PROMPT, xp_band
+
+CACHE_PATH = os.getenv(
+    "EXERCISE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "exercises.sqlite3"),
+)
+CACHE_MAX_ENTRIES = int(os.getenv("EXERCISE_CACHE_MAX", "500"))
+CACHE_TTL = float(os.getenv("EXERCISE_CACHE_TTL", str(7 * 24 * 3600)))
+TEMPLATE_HASH = hashlib.sha256(PRACTICE_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(lang: str, xp: int, template_hash: str = TEMPLATE_HASH) -> str:
+    normalized = unicodedata.normalize("NFC", lang).strip().casefold()
+    return f"{normalized}|{xp_band(xp)}|{template_hash}"
+
+
+class ExerciseCache:
+    """LRU com TTL sobre SQLite; cada linha guarda a saída de ``parse_ai_response``."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: float = CACHE_TTL, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS exercise_sets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cache_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sets_key ON exercise_sets (cache_key, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sets_lru ON exercise_sets (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # uma conexão por operação: seguro entre threads e entre processos
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put(self, lang: str, xp: int, exercises: list) -> int:
+        now = self._clock()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO exercise_sets (cache_key, payload, created, last_used) VALUES (?, ?, ?, ?)",
+                (cache_key(lang, xp), json.dumps(exercises, ensure_ascii=False), now, now),
+            )
+            self._evict(conn, now)
+            return cursor.lastrowid
+
+    def sample(self, lang: str, xp: int, exclude=()):
+        """Sorteia um conjunto válido ainda não visto; devolve ``(id, exercícios)`` ou ``None``."""
+        now = self._clock()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM exercise_sets WHERE cache_key = ? AND created > ?",
+                (cache_key(lang, xp), now - self.ttl),
+            ).fetchall()
+            candidates = [row[0] for row in rows if row[0] not in exclude]
+            if not candidates:
+                return None
+            set_id = random.choice(candidates)
+            row = conn.execute("SELECT payload FROM exercise_sets WHERE id = ?", (set_id,)).fetchone()
+            conn.execute("UPDATE exercise_sets SET last_used = ? WHERE id = ?", (now, set_id))
+        if row is None:
+            return None
+        return set_id, json.loads(row[0])
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM exercise_sets").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM exercise_sets WHERE created <= ?", (now - self.ttl,))
+        conn.execute(
+            """
+            DELETE FROM exercise_sets WHERE id IN (
+                SELECT id FROM exercise_sets ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
@@ -0,0 +1,81 @@
+"""Componente de exercício que roda inteiro no navegador.
+
+Mover palavras, resetar a frase e marcar uma alternativa não falam com o
+servidor. Em ``exercise_component`` só a resposta final volta para ser
+corrigida e o gabarito nunca vai para o navegador; em ``lesson_component`` a
+lição inteira é corrigida no navegador contra hashes salgados das respostas e
+o servidor recebe um resultado só, revalidado por
+``offline_lesson.validate_result``. ``EXERCISE_COMPONENT=0``
+volta para os widgets nativos.
+"""
+
+import os
+
+import streamlit.components.v1 as components
+
+from component_protocol import install_protocol
+from offline_lesson import answer_hash
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "exercise")
+EXERCISE_COMPONENT = os.getenv("EXERCISE_COMPONENT", "1") != "0"
+LABELS = {
+    "phrase": "Sua frase:",
+    "reset": "Resetar frase",
+    "verify": "Verificar resposta",
+    "progress": "Progresso",
+    "correct": "Resposta correta! 🎯",
+    "wrong_arrange": "Quase! Verifique a ordem das palavras.",
+    "wrong_select": "Resposta incorreta. Tente novamente.",
+    "sending": "Lição concluída! Enviando resultado...",
+}
+
+_component = components.declare_component("lingo_exercise", path=COMPONENT_DIR)
+_protocol_ready = install_protocol(COMPONENT_DIR)
+
+
+def component_available() -> bool:
+    return EXERCISE_COMPONENT and _protocol_ready and os.path.exists(os.path.join(COMPONENT_DIR, "index.html"))
+
+
+def client_payload(exercise: dict) -> dict:
+    """Só o que o navegador precisa para montar o exercício, sem ``answer``."""
+    payload = {"type": exercise["type"], "prompt": exercise["prompt"]}
+    if exercise["type"] == "arrange":
+        payload["words"] = list(exercise["words"])
+    else:
+        payload["options"] = list(exercise["options"])
+    return payload
+
+
+def exercise_component(exercise: dict, key: str, on_submit=None, args=()):
+    """Desenha o exercício; ``st.session_state[key]`` recebe ``{"response", "attempt"}`` a cada envio."""
+    return _component(
+        exercise=client_payload(exercise),
+        component_id=key,
+        labels=LABELS,
+        key=key,
+        default=None,
+        on_change=on_submit,
+        args=args,
+    )
+
+
+def lesson_component(lesson: dict, key: str, on_complete=None, args=()):
+    """Lição inteira no navegador; ``st.session_state[key]`` recebe ``{"lesson_id", "results"}`` no fim.
+
+    Cada exercício vai sem ``answer``, só com ``answer_hash`` salgado pela
+    ``key``, que muda a cada tentativa da lição.
+    """
+    exercises = [
+        {**client_payload(exercise), "answer_hash": answer_hash(exercise["answer"], key)}
+        for exercise in lesson["exercises"]
+    ]
+    return _component(
+        lesson={"id": lesson["id"], "salt": key, "exercises": exercises},
+        component_id=key,
+        labels=LABELS,
+        key=key,
+        default=None,
+        on_change=on_complete,
+        args=args,
+    )
@@ -0,0 +1,200 @@
+"""Backend local que imita o Gemini, para testes de carga e latência sem rede.
+
+Selecionado com ``GEMINI_BACKEND=fake``. Tudo é configurável por variáveis
+de ambiente:
+
+- ``FAKE_GEMINI_LATENCY``: ``fixed:0.8``, ``uniform:0.2,1.5`` ou
+  ``lognormal:-0.5,0.6`` (segundos; lognormal recebe mu e sigma).
+- ``FAKE_GEMINI_ERROR_RATE``: fração de chamadas que falham (0 a 1).
+- ``FAKE_GEMINI_MALFORMED_RATE``: fração de respostas de exercícios com JSON
+  problemático para ``parse_ai_response``.
+- ``FAKE_GEMINI_CHUNK_CHARS``: tamanho dos pedaços no modo streaming.
+- ``FAKE_GEMINI_SEED``: semente para execuções reprodutíveis.
+- ``FAKE_GEMINI_MODEL_LATENCY``: latência por modelo, ex.
+  ``gemini-1.5-pro=fixed:2;gemini-1.5-flash=uniform:0.2,0.4``.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from gemini import GeminiClient, key_fingerprint
+
+FAKE_MODEL_NAME = "fake-gemini"
+MALFORMED_KINDS = ("fenced", "preamble", "truncated", "not_list", "invalid_items", "empty")
+
+
+class FakeBackendError(RuntimeError):
+    """Erro simulado do provedor (ex.: 429/503)."""
+
+
+def parse_latency(spec: str):
+    """Converte a especificação de latência em uma função ``rng -> segundos``."""
+    kind, _, raw = spec.partition(":")
+    if not raw:
+        kind, raw = "fixed", kind
+    values = [float(part) for part in raw.split(",")]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Distribuição de latência desconhecida: {spec}")
+
+
+class FakeConfig:
+    def __init__(self, latency: str | None = None, error_rate: float | None = None,
+                 malformed_rate: float | None = None, chunk_chars: int | None = None, seed: int | None = None):
+        self.latency = parse_latency(latency or os.getenv("FAKE_GEMINI_LATENCY", "uniform:0.3,1.2"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0"))
+        self.malformed_rate = (
+            malformed_rate if malformed_rate is not None else float(os.getenv("FAKE_GEMINI_MALFORMED_RATE", "0"))
+        )
+        self.chunk_chars = chunk_chars or int(os.getenv("FAKE_GEMINI_CHUNK_CHARS", "12"))
+        env_seed = os.getenv("FAKE_GEMINI_SEED")
+        self.seed = seed if seed is not None else (int(env_seed) if env_seed else None)
+        self.model_latency = {}
+        for item in filter(None, os.getenv("FAKE_GEMINI_MODEL_LATENCY", "").split(";")):
+            name, _, spec = item.partition("=")
+            self.model_latency[name.strip()] = parse_latency(spec.strip())
+
+    def latency_for(self, model_name: str):
+        return self.model_latency.get(model_name, self.latency)
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+_canned_lock = threading.Lock()
+_canned = {}
+
+
+def canned_exercises(lang: str) -> list:
+    """Exercícios do próprio currículo, usados como payload das respostas falsas."""
+    with _canned_lock:
+        if not _canned:
+            from curriculum import load_pack
+
+            pack = load_pack()
+            for language in pack.languages:
+                _canned[language] = [
+                    exercise for _, lesson in pack.flatten(language) for exercise in lesson["exercises"]
+                ]
+    return _canned.get(lang) or next(iter(_canned.values()))
+
+
+def malformed_payload(kind: str, exercises: list) -> str:
+    valid = json.dumps(exercises, ensure_ascii=False)
+    if kind == "fenced":
+        return f"```json\n{valid}\n```"
+    if kind == "preamble":
+        return f"Claro! Aqui estão os exercícios:\n{valid}\nBons estudos!"
+    if kind == "truncated":
+        return valid[: len(valid) // 2]
+    if kind == "not_list":
+        return json.dumps({"exercises": exercises}, ensure_ascii=False)
+    if kind == "invalid_items":
+        broken = [dict(exercise) for exercise in exercises]
+        for exercise in broken:
+            if exercise["type"] == "select":
+                exercise["answer"] = "resposta fora das opções"
+            else:
+                exercise["words"] = "não é lista"
+        return json.dumps(broken, ensure_ascii=False)
+    return ""
+
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(str(part.get("parts", "")) if isinstance(part, dict) else str(part) for part in contents)
+
+
+class FakeModel:
+    """Imita ``GenerativeModel.generate_content`` com latência, erros e streaming configuráveis.
+
+    Respostas de tutor ecoam a impressão digital da chave que fez a requisição,
+    o que permite detectar credenciais trocadas entre sessões.
+    """
+
+    def __init__(self, api_key: str, config: FakeConfig | None = None, model_name: str = FAKE_MODEL_NAME):
+        self.fingerprint = key_fingerprint(api_key)
+        self.config = config or FakeConfig()
+        self._latency = self.config.latency_for(model_name)
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            return (
+                self._latency(self._rng),
+                self._rng.random() < self.config.error_rate,
+                self._rng.random() < self.config.malformed_rate,
+                self._rng.random(),
+            )
+
+    def _reply(self, contents, malformed: bool, pick: float) -> str:
+        text = _contents_text(contents)
+        if "exercícios" in text and "JSON" in text:
+            match = re.search(r"alunos de (\w+)", text)
+            pool = canned_exercises(match.group(1) if match else "")
+            start = int(pick * len(pool))
+            exercises = [pool[(start + offset) % len(pool)] for offset in range(3)]
+            if malformed:
+                return malformed_payload(MALFORMED_KINDS[int(pick * len(MALFORMED_KINDS))], exercises)
+            return json.dumps(exercises, ensure_ascii=False)
+        return f"[{self.fingerprint[:12]}] Ótima pergunta! Vamos praticar juntos."
+
+    def generate_content(self, contents, stream: bool = False, request_options: dict | None = None, **kwargs):
+        latency, fails, malformed, pick = self._draw()
+        text = self._reply(contents, malformed, pick)
+        # como no SDK, o timeout vale para a chamada inteira, inclusive o stream
+        timeout = (request_options or {}).get("timeout")
+        if stream:
+            return self._stream(text, latency, fails, timeout)
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise FakeBackendError("504 Deadline Exceeded (simulado)")
+        time.sleep(latency)
+        if fails:
+            raise FakeBackendError("503 Service Unavailable (simulado)")
+        return FakeResponse(text)
+
+    def _stream(self, text: str, latency: float, fails: bool, timeout: float | None = None):
+        size = self.config.chunk_chars
+        chunks = [text[index:index + size] for index in range(0, len(text), size)] or [""]
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def pause(seconds: float) -> None:
+            if deadline is not None and time.monotonic() + seconds > deadline:
+                time.sleep(max(0.0, deadline - time.monotonic()))
+                raise FakeBackendError("504 Deadline Exceeded (simulado)")
+            time.sleep(seconds)
+
+        # metade da latência até o primeiro pedaço, o resto distribuído entre eles
+        pause(latency / 2)
+        for index, chunk in enumerate(chunks):
+            if fails and index == len(chunks) // 2:
+                raise FakeBackendError("stream interrompido (simulado)")
+            if index:
+                pause(latency / 2 / len(chunks))
+            yield FakeResponse(chunk)
+
+
+def fake_factory(config: FakeConfig | None = None):
+    """Factory para ``ClientPool`` que devolve clientes falsos."""
+    config = config or FakeConfig()
+
+    def factory(api_key: str) -> GeminiClient:
+        def model_factory(name: str) -> FakeModel:
+            return FakeModel(api_key, config, name)
+
+        return GeminiClient(api_key, FAKE_MODEL_NAME, model_factory(FAKE_MODEL_NAME), model_factory)
+
+    return factory
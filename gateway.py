@@ -0,0 +1,256 @@
+"""Gateway assíncrono para as chamadas ao Gemini.
+
+Todas as sessões do processo passam por um único loop asyncio (em uma thread
+própria), que aplica:
+
+- limite global de chamadas simultâneas;
+- token bucket por chave de API;
+- filas por prioridade (tutor antes de exercícios, exercícios antes de prefetch);
+- coalescência de prompts idênticos já em andamento, só para quem pede
+  (``coalesce=True``): geração de exercícios não é determinística e cada
+  chamada precisa da própria resposta.
+
+Um stream ocupa a vaga até o último pedaço: a thread do gateway continua
+lendo o SDK e entrega os pedaços por um ``StreamRelay``.
+
+As threads do Streamlit continuam síncronas: ``bind`` devolve um objeto com o
+mesmo ``generate_content`` do SDK, que espera o resultado do gateway.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stream_relay import relay_stream
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PRACTICE = 1
+PRIORITY_PREFETCH = 2
+
+GATEWAY_CONCURRENCY = int(os.getenv("GATEWAY_CONCURRENCY", "8"))
+GATEWAY_RATE_PER_MINUTE = float(os.getenv("GATEWAY_RATE_PER_MINUTE", "60"))
+GATEWAY_BURST = int(os.getenv("GATEWAY_BURST", "10"))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: int, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        self._refill()
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Request:
+    __slots__ = (
+        "priority", "seq", "bucket_key", "client", "contents", "kwargs", "future", "coalesce_key", "waiters", "deadline",
+    )
+
+    def __init__(self, priority, seq, bucket_key, client, contents, kwargs, future, coalesce_key, deadline=None):
+        self.priority = priority
+        self.seq = seq
+        self.bucket_key = bucket_key
+        self.client = client
+        self.contents = contents
+        self.kwargs = kwargs
+        self.future = future
+        self.coalesce_key = coalesce_key
+        self.waiters = 0
+        self.deadline = deadline
+        # quem desistiu (prazo, hedge perdedor) não lê mais o resultado
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+def _coalesce_key(bucket_key: str, client, contents, kwargs: dict) -> str | None:
+    if kwargs.get("stream"):
+        return None  # streams têm um consumidor só; não dá para compartilhar
+    try:
+        payload = json.dumps([contents, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return None
+    return f"{bucket_key}|{getattr(client, 'model_name', '')}|{payload}"
+
+
+class Gateway:
+    def __init__(self, concurrency: int = GATEWAY_CONCURRENCY, rate_per_minute: float = GATEWAY_RATE_PER_MINUTE,
+                 burst: int = GATEWAY_BURST):
+        self.concurrency = max(1, concurrency)
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="gateway")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="gemini-gateway", daemon=True)
+        self._thread.start()
+        self._seq = itertools.count()
+        self._queue = []
+        self._inflight = {}
+        self._buckets = {}
+        self._active = 0
+        self._timer = None
+        self.stats = {"submitted": 0, "coalesced": 0, "completed": 0, "failed": 0, "throttled": 0, "max_queue": 0}
+
+    def submit(self, client, contents, priority: int = PRIORITY_PRACTICE, coalesce: bool = False,
+               deadline: float | None = None, **kwargs):
+        """Enfileira a chamada e devolve um ``concurrent.futures.Future`` com a resposta.
+
+        ``deadline`` (``time.monotonic``) vira o timeout do SDK com o tempo que
+        sobrar quando a chamada sair da fila; se já tiver passado, nem é feita.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._enqueue(client, contents, priority, kwargs, coalesce, deadline), self._loop
+        )
+
+    def call(self, client, contents, priority: int = PRIORITY_PRACTICE, timeout: float | None = None, **kwargs):
+        return self.submit(client, contents, priority, **kwargs).result(timeout)
+
+    def bind(self, client, priority: int, coalesce: bool = False):
+        """``coalesce=True`` só para chamadas cuja resposta pode ser dividida entre quem pediu igual."""
+        return GatewayClient(self, client, priority, coalesce) if client is not None else None
+
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    async def _enqueue(self, client, contents, priority: int, kwargs: dict, coalesce: bool = False,
+                       deadline: float | None = None):
+        bucket_key = getattr(client, "fingerprint", None) or str(id(client))
+        coalesce_key = _coalesce_key(bucket_key, client, contents, kwargs) if coalesce else None
+        self.stats["submitted"] += 1
+        shared = self._inflight.get(coalesce_key) if coalesce_key else None
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            shared.priority = min(shared.priority, priority)
+            if shared.deadline is not None:
+                shared.deadline = None if deadline is None else max(shared.deadline, deadline)
+            return await self._wait(shared)
+        request = _Request(
+            priority, next(self._seq), bucket_key, client, contents, kwargs,
+            self._loop.create_future(), coalesce_key, deadline,
+        )
+        if coalesce_key:
+            self._inflight[coalesce_key] = request
+        self._queue.append(request)
+        self.stats["max_queue"] = max(self.stats["max_queue"], len(self._queue))
+        self._dispatch()
+        return await self._wait(request)
+
+    async def _wait(self, request: _Request):
+        request.waiters += 1
+        try:
+            return await asyncio.shield(request.future)
+        except asyncio.CancelledError:
+            request.waiters -= 1
+            # ninguém mais espera e ainda não saiu da fila: não gasta a chamada
+            if request.waiters == 0 and request in self._queue:
+                self._queue.remove(request)
+                if request.coalesce_key:
+                    self._inflight.pop(request.coalesce_key, None)
+                request.future.cancel()
+            raise
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate_per_second, self.burst)
+        return bucket
+
+    def _dispatch(self) -> None:
+        """Libera, por ordem de prioridade, os pedidos com vaga e token disponíveis."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._queue.sort(key=lambda request: (request.priority, request.seq))
+        next_wait = None
+        index = 0
+        while index < len(self._queue) and self._active < self.concurrency:
+            request = self._queue[index]
+            bucket = self._bucket(request.bucket_key)
+            if not bucket.try_take():
+                wait = bucket.wait_time()
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                self.stats["throttled"] += 1
+                index += 1
+                continue
+            del self._queue[index]
+            self._active += 1
+            self._loop.create_task(self._run(request))
+        if next_wait is not None:
+            self._timer = self._loop.call_later(next_wait, self._dispatch)
+
+    async def _run(self, request: _Request) -> None:
+        try:
+            result = await self._loop.run_in_executor(self._executor, self._call, request)
+        except Exception as exc:
+            self.stats["failed"] += 1
+            request.future.set_exception(exc)
+        else:
+            self.stats["completed"] += 1
+            if not request.future.done():  # streams já foram entregues ao abrir
+                request.future.set_result(result)
+        finally:
+            if request.coalesce_key:
+                self._inflight.pop(request.coalesce_key, None)
+            self._active -= 1
+            self._dispatch()
+
+    def _call(self, request: _Request):
+        kwargs = request.kwargs
+        if request.deadline is not None:
+            remaining = request.deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("prazo esgotado na fila do gateway")
+            kwargs = {**kwargs, "timeout": remaining}
+        if not kwargs.get("stream"):
+            return request.client.generate_content(request.contents, **kwargs)
+        # entrega o relay assim que o stream abre e segue lendo aqui, segurando a vaga
+        relay_stream(
+            lambda: request.client.generate_content(request.contents, **kwargs),
+            lambda relay: self._loop.call_soon_threadsafe(self._deliver, request, relay),
+        )
+        return None
+
+    @staticmethod
+    def _deliver(request: _Request, relay) -> None:
+        if request.future.done() or request.waiters == 0:
+            relay.close()  # quem pediu já desistiu: para de ler o stream
+        else:
+            request.future.set_result(relay)
+
+
+class GatewayClient:
+    """Cliente com a mesma interface do SDK, mas que passa pelo gateway com uma prioridade fixa."""
+
+    def __init__(self, gateway: Gateway, client, priority: int, coalesce: bool = False):
+        self._gateway = gateway
+        self._client = client
+        self.priority = priority
+        self.coalesce = coalesce
+        self.model_name = getattr(client, "model_name", None)
+        self.fingerprint = getattr(client, "fingerprint", None)
+
+    def generate_content(self, contents, **kwargs):
+        return self._gateway.call(self._client, contents, self.priority, coalesce=self.coalesce, **kwargs)
+
+    def submit(self, contents, coalesce: bool = True, deadline: float | None = None, **kwargs):
+        return self._gateway.submit(self._client, contents, self.priority, coalesce and self.coalesce, deadline, **kwargs)
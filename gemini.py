@@ -0,0 +1,203 @@
+"""Acesso ao Gemini compartilhado por todas as sessões do processo."""
+
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import google.generativeai as genai
+    from google.ai import generativelanguage as glm
+except ImportError:  # pragma: no cover - dependency is optional at runtime
+    genai = None
+    glm = None
+
+
+MODEL_CANDIDATES = [
+    "models/gemini-flash-latest",  # recomendação atual
+    "gemini-flash-latest",
+    "gemini-1.5-flash",
+    "gemini-1.5-pro",
+    "gemini-pro",
+]
+BACKEND = os.getenv("GEMINI_BACKEND", "google")
+FAKE_API_KEY = "fake-local-key"
+POOL_IDLE_TTL = float(os.getenv("GEMINI_POOL_IDLE_TTL", "900"))
+POOL_MAX_ENTRIES = int(os.getenv("GEMINI_POOL_MAX_ENTRIES", "256"))
+
+
+def model_candidates() -> list:
+    candidates = []
+    env_model = os.getenv("GEMINI_MODEL")
+    if env_model:
+        candidates.append(env_model)
+    candidates.extend(name for name in MODEL_CANDIDATES if name != env_model)
+    return candidates
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Hash da chave; a chave em si nunca vira chave de dicionário nem aparece em logs."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class GeminiClient:
+    """Modelo Gemini amarrado às credenciais de uma chave.
+
+    Cada requisição usa o transporte do próprio cliente, então sessões com
+    chaves diferentes podem chamar ``generate_content`` em paralelo sem
+    depender do ``genai.configure`` global.
+    """
+
+    def __init__(self, api_key: str, model_name: str, model, model_factory=None, siblings: dict | None = None):
+        self.fingerprint = key_fingerprint(api_key)
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = model
+        self._model_factory = model_factory
+        self._siblings = siblings if siblings is not None else {}
+        self._siblings[model_name] = self
+
+    def generate_content(self, contents, timeout: float | None = None, **kwargs):
+        """``timeout`` (segundos) vira prazo do próprio SDK: a chamada pendurada é cancelada e libera a thread."""
+        if timeout is not None:
+            kwargs["request_options"] = {**(kwargs.get("request_options") or {}), "timeout": timeout}
+        return self._model.generate_content(contents, **kwargs)
+
+    def for_model(self, model_name: str | None) -> "GeminiClient":
+        """Cliente da mesma chave para outro modelo, criado uma vez e compartilhado."""
+        if not model_name or model_name == self.model_name or self._model_factory is None:
+            return self
+        sibling = self._siblings.get(model_name)
+        if sibling is None:
+            sibling = GeminiClient(
+                self._api_key, model_name, self._model_factory(model_name), self._model_factory, self._siblings
+            )
+        return sibling
+
+
+def build_model(api_key: str) -> GeminiClient | None:
+    """Cria o cliente do primeiro candidato que constrói, sem tocar no estado global do SDK."""
+    if genai is None:
+        return None
+    transport = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+    def model_factory(name: str):
+        model = genai.GenerativeModel(name)
+        # o SDK só cria o cliente padrão (global) quando _client está vazio
+        model._client = transport
+        return model
+
+    for name in model_candidates():
+        try:
+            model = model_factory(name)
+        except Exception:
+            continue
+        return GeminiClient(api_key, name, model, model_factory)
+    return None
+
+
+def backend_available(backend: str = BACKEND) -> bool:
+    return backend == "fake" or genai is not None
+
+
+def default_api_key(backend: str = BACKEND) -> str | None:
+    """O backend falso não precisa de chave real; as demais exigem uma."""
+    return FAKE_API_KEY if backend == "fake" else None
+
+
+def backend_factory(backend: str = BACKEND):
+    """Factory ``api_key -> cliente`` do backend escolhido em ``GEMINI_BACKEND``.
+
+    Qualquer cliente serve desde que tenha ``model_name`` e
+    ``generate_content(contents, stream=False, timeout=None)``, como ``GeminiClient``.
+    """
+    if backend == "google":
+        return build_model
+    if backend == "fake":
+        from fake_gemini import fake_factory
+
+        return fake_factory()
+    raise ValueError(f"GEMINI_BACKEND desconhecido: {backend}")
+
+
+class _PoolEntry:
+    __slots__ = ("client", "model_name", "last_used", "ready")
+
+    def __init__(self):
+        self.client = None
+        self.model_name = None
+        self.last_used = 0.0
+        self.ready = threading.Event()
+
+
+class ClientPool:
+    """Clientes Gemini por chave de API, construídos uma vez e reaproveitados entre sessões.
+
+    Entradas sem uso por ``idle_ttl`` segundos são descartadas; acima de
+    ``max_entries`` a menos usada recentemente sai primeiro.
+    """
+
+    def __init__(self, factory=None, idle_ttl: float = POOL_IDLE_TTL,
+                 max_entries: int = POOL_MAX_ENTRIES, clock=time.monotonic):
+        self._factory = factory or backend_factory()
+        self._idle_ttl = idle_ttl
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str):
+        """Cliente da chave, ou ``None`` se nenhum modelo pôde ser criado."""
+        return self.get_entry(api_key).client
+
+    def model_name(self, api_key: str) -> str | None:
+        return self.get_entry(api_key).model_name
+
+    def get_entry(self, api_key: str) -> _PoolEntry:
+        fingerprint = key_fingerprint(api_key)
+        now = self._clock()
+        with self._lock:
+            self._evict_locked(now)
+            entry = self._entries.get(fingerprint)
+            owner = entry is None
+            if owner:
+                entry = _PoolEntry()
+                self._entries[fingerprint] = entry
+            entry.last_used = now
+        if owner:
+            # constrói fora do lock; outras sessões com a mesma chave aguardam o evento
+            try:
+                entry.client = self._factory(api_key)
+                entry.model_name = getattr(entry.client, "model_name", None)
+            finally:
+                if entry.client is None:
+                    with self._lock:
+                        if self._entries.get(fingerprint) is entry:
+                            del self._entries[fingerprint]
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+        return entry
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._evict_locked(self._clock())
+
+    def _evict_locked(self, now: float) -> int:
+        expired = [
+            fingerprint
+            for fingerprint, entry in self._entries.items()
+            if entry.ready.is_set() and now - entry.last_used > self._idle_ttl
+        ]
+        for fingerprint in expired:
+            del self._entries[fingerprint]
+        overflow = len(self._entries) - self._max_entries
+        if overflow > 0:
+            oldest = sorted(self._entries.items(), key=lambda item: item[1].last_used)
+            for fingerprint, _ in oldest[:overflow]:
+                del self._entries[fingerprint]
+                expired.append(fingerprint)
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,130 @@
+"""Grade de lições do dashboard como um único componente.
+
+O HTML de cada card é montado uma vez por ``(lição, estado)`` e vai para o
+navegador num catálogo estático (``catalog-<hash>.json`` na pasta do
+componente, com o hash do currículo no nome). A cada rerun só segue uma
+string com um caractere de estado por lição; o navegador troca apenas os cards
+que mudaram e devolve ``{"lesson_id", "nonce"}`` quando o aluno começa uma
+lição. ``LESSON_GRID_COMPONENT=0`` volta para os cards em markdown.
+"""
+
+import hashlib
+import html
+import json
+import os
+
+import streamlit.components.v1 as components
+
+from component_protocol import install_protocol
+from curriculum import STATUS_DONE, STATUS_LOCKED, STATUS_OPEN
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "lesson_grid")
+LESSON_GRID_COMPONENT = os.getenv("LESSON_GRID_COMPONENT", "1") != "0"
+LEVEL_ORDER = ["Básico", "Intermediário", "Avançado"]
+# slots mínimos por nível; níveis maiores mostram todas as lições
+MIN_SLOTS = 6
+GRID_VERSION = 1
+# um caractere por lição no vetor de estados
+STATUS_CODES = {STATUS_LOCKED: "l", STATUS_OPEN: "o", STATUS_DONE: "d"}
+STATUS_LABELS = {
+    STATUS_LOCKED: ("Bloqueada", "status-locked", "Bloqueada"),
+    STATUS_OPEN: ("Disponível", "status-open", "Começar"),
+    STATUS_DONE: ("Concluída", "status-done", "Rever lição"),
+}
+
+_component = components.declare_component("lingo_lesson_grid", path=COMPONENT_DIR)
+_protocol_ready = install_protocol(COMPONENT_DIR)
+
+
+def grid_available() -> bool:
+    return LESSON_GRID_COMPONENT and _protocol_ready and os.path.exists(os.path.join(COMPONENT_DIR, "index.html"))
+
+
+def _card(number: int, title: str, level: str, description: str, status: str, button: str, lesson_id: str = "") -> str:
+    text, pill, label = STATUS_LABELS[status]
+    disabled = " disabled" if status == STATUS_LOCKED else ""
+    return (
+        '<div class="lesson-card"><div class="lesson-head">'
+        f'<div class="lesson-icon">{number}</div><div>'
+        f'<div class="lesson-title">{html.escape(title)}</div>'
+        f'<div class="lesson-level">{html.escape(level)}</div></div></div>'
+        f'<p class="lesson-desc">{html.escape(description)}</p>'
+        f'<div class="lesson-footer"><span class="status-pill {pill}">{text}</span></div>'
+        f'<button type="button" class="start" data-id="{html.escape(lesson_id)}"{disabled}>{button or label}</button>'
+        "</div>"
+    )
+
+
+class LessonGrid:
+    """Catálogo de cards de um pacote de currículo, montado uma vez por processo."""
+
+    def __init__(self, pack, directory: str = COMPONENT_DIR):
+        self._pack = pack
+        self._cards = {}
+        self._order = {}
+        self._numbers = {}
+        catalog = {"languages": {}, "cards": {}}
+        for language in pack.languages:
+            levels = []
+            order = []
+            for level in LEVEL_ORDER:
+                ids = pack.lesson_ids(language, level)
+                levels.append({"name": level, "ids": ids, "slots": max(MIN_SLOTS, len(ids))})
+                order.extend(ids)
+            catalog["languages"][language] = levels
+            self._order[language] = order
+            for level in levels:
+                for number, lesson_id in enumerate(level["ids"], start=1):
+                    self._numbers[lesson_id] = number
+                    catalog["cards"][lesson_id] = {
+                        STATUS_CODES[status]: self.card_html(lesson_id, status) for status in STATUS_CODES
+                    }
+        catalog["placeholder"] = _card(
+            0, "Em breve", "Slot vazio", "Novo conteúdo será adicionado aqui.", STATUS_LOCKED, "Em breve"
+        )
+        self.catalog = catalog
+        raw = json.dumps(catalog, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(raw + f"|{GRID_VERSION}".encode()).hexdigest()[:16]
+        self.catalog_file = self._publish(directory, f"catalog-{digest}.json", raw)
+
+    def card_html(self, lesson_id: str, status: str) -> str:
+        """HTML do card memoizado por ``(lição, estado)``."""
+        key = (lesson_id, status)
+        if key not in self._cards:
+            lesson = self._pack.lesson(lesson_id)
+            self._cards[key] = _card(
+                self._numbers[lesson_id], lesson["title"], lesson["level"], lesson["description"], status, "", lesson_id
+            )
+        return self._cards[key]
+
+    @staticmethod
+    def _publish(directory: str, name: str, raw: bytes) -> str | None:
+        """Grava o catálogo ao lado do ``index.html``; sem escrita, ele vai junto dos args."""
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return name
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as handle:
+                handle.write(raw)
+            os.replace(tmp_path, path)
+        except OSError:
+            return None
+        return name
+
+    def status_vector(self, language: str, statuses: dict) -> str:
+        """Um caractere por lição, na ordem dos níveis do catálogo."""
+        return "".join(STATUS_CODES[statuses[lesson_id]] for lesson_id in self._order.get(language, ()))
+
+    def render(self, language: str, statuses: dict, key: str, on_start=None, args=()):
+        """Desenha a grade; ``st.session_state[key]`` recebe ``{"lesson_id", "nonce"}`` a cada início."""
+        return _component(
+            catalog_file=self.catalog_file,
+            catalog=None if self.catalog_file else self.catalog,
+            language=language,
+            statuses=self.status_vector(language, statuses),
+            key=key,
+            default=None,
+            on_change=on_start,
+            args=args,
+        )
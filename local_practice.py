@@ -0,0 +1,156 @@
+"""Gerador local de exercícios a partir das frases do próprio currículo.
+
+Sem rede: frases no idioma estudado (respostas de ``arrange`` e de ``select``)
+viram novos ``arrange`` embaralhados e ``select`` de completar lacuna, com
+alternativas tiradas de um índice de vocabulário por frequência.
+"""
+
+import os
+import random
+import re
+from collections import Counter
+
+LOCAL_PRACTICE_RATIO = float(os.getenv("LOCAL_PRACTICE_RATIO", "0.1"))
+# XP para liberar frases do nível seguinte do currículo
+LOCAL_PRACTICE_XP_PER_LEVEL = int(os.getenv("LOCAL_PRACTICE_XP_PER_LEVEL", "200"))
+LOCAL_SET_SIZE = 3
+
+_QUOTED = re.compile(r"'([^']+)'")
+_WORD = re.compile(r"[^\W\d_][\w'-]*")
+_TRAILING = re.compile(r"^(.*?)(\.\.\.|[.,?!:;]+)$")
+_CLOSING = {".", ",", "?", "!", ":", ";", "...", "…"}
+
+
+def tokenize(sentence: str) -> list:
+    """Separa a pontuação final de cada palavra, como nos ``arrange`` do currículo."""
+    tokens = []
+    for part in sentence.split():
+        match = _TRAILING.match(part)
+        if match and match.group(1):
+            tokens.extend([match.group(1), match.group(2)])
+        else:
+            tokens.append(part)
+    return tokens
+
+
+def join_tokens(tokens: list) -> str:
+    text = ""
+    for token in tokens:
+        text += token if not text or token in _CLOSING else f" {token}"
+    return text
+
+
+def _words(text: str) -> list:
+    return _WORD.findall(text.casefold())
+
+
+def _is_word(token: str) -> bool:
+    return bool(_WORD.fullmatch(token.lstrip("¿¡")))
+
+
+def _vocab_key(token: str) -> str:
+    return token.lstrip("¿¡").casefold()
+
+
+def target_sentences(exercises: list):
+    """Frases no idioma estudado, com o enunciado de onde vieram.
+
+    Respostas de ``arrange`` sempre estão no idioma estudado. Em ``select``,
+    a resposta às vezes é a tradução em português; compara-se o vocabulário
+    da resposta com o do trecho citado no enunciado e, no empate, a frase fica
+    de fora.
+    """
+    target_vocab = {word for item in exercises if item["type"] == "arrange" for word in _words(" ".join(item["answer"]))}
+    native_vocab = {word for item in exercises for word in _words(_QUOTED.sub(" ", item["prompt"]))}
+
+    def leaning(text: str) -> int:
+        words = _words(text)
+        return sum(word in target_vocab for word in words) - sum(word in native_vocab for word in words)
+
+    for item in exercises:
+        if item["type"] == "arrange":
+            yield list(item["answer"]), item["prompt"], []
+            continue
+        quoted = _QUOTED.search(item["prompt"])
+        if quoted is None or leaning(item["answer"]) > leaning(quoted.group(1)):
+            yield tokenize(item["answer"]), item["prompt"], item["options"]
+
+
+class LocalGenerator:
+    """Índice por idioma (frases por nível + frequência de palavras) montado uma vez por processo."""
+
+    def __init__(self, pack, ratio: float = LOCAL_PRACTICE_RATIO,
+                 xp_per_level: int = LOCAL_PRACTICE_XP_PER_LEVEL, seed: int | None = None):
+        self.ratio = ratio
+        self.xp_per_level = max(1, xp_per_level)
+        self._rng = random.Random(seed)
+        self._sentences = {}
+        self._vocabulary = {}
+        self._ranks = {}
+        for language in pack.languages:
+            sentences = []
+            frequency = Counter()
+            for level_index, level in enumerate(pack.levels(language)):
+                exercises = [item for lesson in pack.lessons_in_level(language, level) for item in lesson["exercises"]]
+                for tokens, prompt, options in target_sentences(exercises):
+                    frequency.update(_vocab_key(token) for token in tokens if _is_word(token))
+                    for option in options:
+                        frequency.update(_vocab_key(token) for token in tokenize(option) if _is_word(token))
+                    if len(tokens) >= 3:
+                        sentences.append((level_index, tokens, prompt))
+            self._sentences[language] = sentences
+            # mais frequentes primeiro; a posição serve de "faixa de frequência" para as alternativas
+            self._vocabulary[language] = [word for word, _ in frequency.most_common()]
+            self._ranks[language] = {word: rank for rank, word in enumerate(self._vocabulary[language])}
+
+    def should_serve(self) -> bool:
+        return self.ratio > 0 and self._rng.random() < self.ratio
+
+    def generate(self, lang: str, xp: int, count: int = LOCAL_SET_SIZE):
+        """Conjunto de ``count`` exercícios novos no formato de ``normalize_exercise``, ou ``None``."""
+        max_level = max(0, int(xp)) // self.xp_per_level
+        pool = [sentence for sentence in self._sentences.get(lang, ()) if sentence[0] <= max_level]
+        if not pool:
+            return None
+        picked = self._rng.sample(pool, min(count, len(pool)))
+        exercises = []
+        for index, (_, tokens, prompt) in enumerate(picked):
+            exercise = self._cloze(lang, tokens) if index % 2 else None
+            exercises.append(exercise or self._arrange(tokens, prompt))
+        self._rng.shuffle(exercises)
+        return exercises
+
+    def _arrange(self, tokens: list, prompt: str) -> dict:
+        words = list(tokens)
+        self._rng.shuffle(words)
+        if not prompt.startswith("Monte"):
+            prompt = f"Monte a frase. {prompt}"
+        return {"type": "arrange", "prompt": prompt, "words": words, "answer": list(tokens)}
+
+    def _cloze(self, lang: str, tokens: list):
+        vocabulary = self._vocabulary[lang]
+        rank = self._ranks[lang]
+        positions = [
+            index for index, token in enumerate(tokens)
+            if _is_word(token) and len(token) > 1 and token[0] not in "¿¡"
+        ]
+        if not positions:
+            return None
+        # palavras raras (de conteúdo) valem mais como lacuna do que artigos e preposições
+        weights = [1 + rank.get(_vocab_key(tokens[index]), 0) for index in positions]
+        blank = self._rng.choices(positions, weights)[0]
+        answer = tokens[blank]
+        used = {_vocab_key(token) for token in tokens}
+        answer_rank = rank.get(_vocab_key(answer), len(vocabulary))
+        # vizinhas no ranking de frequência: alternativas tão comuns quanto a resposta
+        window = vocabulary[max(0, answer_rank - 6):answer_rank + 7]
+        nearby = [word for word in window if word not in used and "-" not in word]
+        if len(nearby) < 2:
+            return None
+        distractors = self._rng.sample(nearby, min(3, len(nearby)))
+        if answer[:1].isupper():
+            distractors = [word[:1].upper() + word[1:] for word in distractors]
+        options = [answer, *distractors]
+        self._rng.shuffle(options)
+        sentence = join_tokens(tokens[:blank] + ["___"] + tokens[blank + 1:])
+        return {"type": "select", "prompt": f"Complete: {sentence}", "options": options, "answer": answer}
@@ -0,0 +1,216 @@
+"""Escolha do modelo Gemini mais rápido e saudável para cada tipo de carga.
+
+Cada candidato recebe uma sonda por carga, com o mesmo prompt para todos: uma
+troca curta de chat para o tutor e uma geração de exercícios do tamanho da
+Prática Mágica. As sondas usam a chave do servidor e passam pelo gateway na
+prioridade mais baixa, com prazo ``MODEL_PROBE_TIMEOUT``. Só a latência das
+sondas entra no ranking: as chamadas reais vão quase todas para o modelo
+atual, com prompts e tamanhos diferentes, e não seriam comparáveis com os
+outros. Elas contam apenas para a saúde (taxa de erro) de cada modelo, e só
+as feitas com a chave do servidor: a cota estourada da chave pessoal de um
+aluno não pode tirar um modelo de todas as sessões. O
+ranking vale para todas as sessões do processo, expira em
+``MODEL_RANKING_TTL`` segundos e é refeito em segundo plano, sem bloquear
+quem pediu.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from gateway import PRIORITY_PREFETCH
+from gemini import model_candidates
+from practice import build_practice_prompt
+
+MODEL_RANKING_ENABLED = os.getenv("MODEL_RANKING", "1") != "0" and not os.getenv("GEMINI_MODEL")
+MODEL_RANKING_TTL = float(os.getenv("MODEL_RANKING_TTL", "300"))
+# cobre a sonda de exercícios, que gera JSON completo
+PROBE_TIMEOUT = float(os.getenv("MODEL_PROBE_TIMEOUT", "30"))
+PROBES = {
+    "tutor": (
+        "Você é um tutor nativo de Inglês. Corrija suavemente erros, incentive e responda de forma curta.\n\n"
+        "Aluno: How I say \"bom dia\" in english?"
+    ),
+    "practice": build_practice_prompt("Inglês", 0),
+}
+# prefetch usa o mesmo ranking da Prática Mágica; o resumo do chat, o do tutor
+WORKLOAD_ALIASES = {"prefetch": "practice", "summary": "tutor"}
+UNHEALTHY_ERROR_RATE = 0.5
+WINDOW = 50
+
+
+class ModelStats:
+    def __init__(self, window: int = WINDOW):
+        self.latencies = {}  # só sondas, por carga
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, ok: bool) -> None:
+        self.outcomes.append(ok)
+
+    def record_probe(self, workload: str, latency: float | None, ok: bool) -> None:
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.setdefault(workload, deque(maxlen=WINDOW)).append(latency)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def healthy(self) -> bool:
+        return len(self.outcomes) < 3 or self.error_rate() < UNHEALTHY_ERROR_RATE
+
+    def median(self, workload: str) -> float | None:
+        samples = self.latencies.get(workload)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[len(ordered) // 2]
+
+
+class _TimedClient:
+    """Mede só a chamada ao modelo, sem a espera na fila do gateway."""
+
+    def __init__(self, client):
+        self._client = client
+        self.model_name = getattr(client, "model_name", None)
+        self.fingerprint = getattr(client, "fingerprint", None)
+        self.started = None
+        self.latency = None
+
+    def generate_content(self, contents, **kwargs):
+        self.started = time.monotonic()
+        response = self._client.generate_content(contents, **kwargs)
+        self.latency = time.monotonic() - self.started
+        return response
+
+
+class ModelRanker:
+    """Ranking por carga, pela latência das sondas, e saúde de cada modelo.
+
+    ``probe_client(nome)`` devolve o cliente da chave do servidor para aquele
+    modelo (ou ``None`` para não sondar); com ``gateway``, as sondas entram na
+    fila com ``PRIORITY_PREFETCH`` e o limite de taxa da chave. ``fingerprint``
+    é o da chave do servidor; chamadas reais de outras chaves são ignoradas.
+    """
+
+    def __init__(self, candidates: list | None = None, ttl: float = MODEL_RANKING_TTL,
+                 enabled: bool = MODEL_RANKING_ENABLED, probe_client=None, gateway=None, fingerprint=None,
+                 clock=time.monotonic):
+        self.candidates = candidates or model_candidates()
+        self.ttl = ttl
+        self.enabled = enabled
+        self.probe_client = probe_client
+        self.gateway = gateway
+        self.fingerprint = fingerprint
+        self._clock = clock
+        self._stats = {name: ModelStats() for name in self.candidates}
+        self._rankings = {}
+        self._ranked_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.candidates) * len(PROBES) or 1, thread_name_prefix="probe"
+        )
+
+    def record(self, model_name: str, fingerprint: str | None, workload: str, latency: float | None, ok: bool) -> None:
+        """Resultado de uma chamada real: conta só para a saúde do modelo, e só com a chave do servidor."""
+        if self.fingerprint is None or fingerprint != self.fingerprint:
+            return
+        self._update(model_name, lambda stats: stats.record(ok))
+
+    def _record_probe(self, model_name: str, workload: str, latency: float | None, ok: bool) -> None:
+        self._update(model_name, lambda stats: stats.record_probe(workload, latency, ok))
+
+    def _update(self, model_name: str, apply) -> None:
+        with self._lock:
+            stats = self._stats.get(model_name)
+            if stats is None:
+                return
+            was_healthy = stats.healthy()
+            apply(stats)
+            if stats.healthy() != was_healthy:
+                self._rankings = {}  # modelo ficou (in)disponível: não espera o TTL
+
+    def ranking(self, workload: str) -> list:
+        workload = WORKLOAD_ALIASES.get(workload, workload)
+        with self._lock:
+            cached = self._rankings.get(workload)
+            if cached is not None:
+                return cached
+
+            def score(item):
+                index, name = item
+                stats = self._stats[name]
+                median = stats.median(workload)
+                return (not stats.healthy(), median is None, median or 0.0, index)
+
+            ranked = [name for _, name in sorted(enumerate(self.candidates), key=score)]
+            self._rankings[workload] = ranked
+            return ranked
+
+    def best(self, workload: str) -> str | None:
+        """Modelo para a carga; dispara a reclassificação em segundo plano se o ranking expirou."""
+        if not self.enabled:
+            return None
+        if self.probe_client is not None and self._stale():
+            self.refresh()
+        return self.ranking(workload)[0]
+
+    def _stale(self) -> bool:
+        return self._ranked_at is None or self._clock() - self._ranked_at > self.ttl
+
+    def refresh(self) -> bool:
+        """Sonda todos os candidatos em uma thread de fundo; ignora se já houver sondagem."""
+        with self._lock:
+            if self._probing:
+                return False
+            self._probing = True
+        threading.Thread(target=self._probe_all, name="model-ranking", daemon=True).start()
+        return True
+
+    def _probe_all(self) -> None:
+        try:
+            deadline = time.monotonic() + PROBE_TIMEOUT
+            probes = []
+            for name in self.candidates:
+                client = self.probe_client(name)
+                if client is None:
+                    continue
+                for workload, prompt in PROBES.items():
+                    timed = _TimedClient(client)
+                    probes.append((name, workload, timed, self._submit(timed, prompt, deadline)))
+            for name, workload, timed, future in probes:
+                try:
+                    future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception:
+                    future.cancel()
+                    # preso na fila atrás de chamadas reais não é falha do modelo
+                    if timed.started is not None:
+                        self._record_probe(name, workload, None, False)
+                else:
+                    self._record_probe(name, workload, timed.latency, True)
+        finally:
+            with self._lock:
+                self._rankings = {}
+                self._ranked_at = self._clock()
+                self._probing = False
+
+    def _submit(self, client, prompt: str, deadline: float):
+        if self.gateway is not None:
+            # sem coalescer: cada candidato precisa da própria chamada
+            return self.gateway.submit(client, prompt, PRIORITY_PREFETCH, coalesce=False, deadline=deadline)
+        return self._executor.submit(client.generate_content, prompt, timeout=PROBE_TIMEOUT)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "healthy": stats.healthy(),
+                    "error_rate": round(stats.error_rate(), 3),
+                    "median": {workload: stats.median(workload) for workload in stats.latencies},
+                }
+                for name, stats in self._stats.items()
+            }
@@ -0,0 +1,72 @@
+"""Revalidação do resultado de uma lição feita inteira no navegador.
+
+O navegador recebe só o hash salgado de cada resposta (``answer_hash``), não a
+resposta, e manda no fim da lição a resposta certa de cada exercício com o
+número de tentativas e o tempo gasto. Nada disso é confiável: o servidor
+confere as respostas com o gabarito que ele mesmo guarda (currículo ou a
+lição gerada na sessão) e mede ele mesmo o tempo desde o início da lição,
+recusando lições feitas mais rápido do que um aluno conseguiria.
+"""
+
+import hashlib
+import json
+import os
+
+OFFLINE_LESSONS = os.getenv("OFFLINE_LESSONS", "1") != "0"
+# menos que isso por exercício é clique automatizado, não aluno
+MIN_EXERCISE_MS = int(os.getenv("OFFLINE_MIN_EXERCISE_MS", "300"))
+MAX_ATTEMPTS = 1000
+
+
+class LessonResultError(ValueError):
+    """Resultado enviado pelo navegador não confere com a lição."""
+
+
+def answer_hash(answer, salt: str) -> str:
+    """SHA-256 de ``salt:resposta`` (JSON compacto), igual ao calculado pelo componente."""
+    raw = json.dumps(answer, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{salt}:{raw}".encode("utf-8")).hexdigest()
+
+
+def validate_result(lesson_id: str, exercises: list, payload, elapsed_ms: float,
+                    min_ms: int = MIN_EXERCISE_MS) -> list:
+    """Confere o resultado e devolve ``[{"attempts", "ms"}, ...]`` por exercício.
+
+    ``elapsed_ms`` é o tempo medido pelo servidor desde o início da lição.
+    Levanta ``LessonResultError`` se a lição, a ordem, alguma resposta, os
+    números de tentativas/tempo ou o tempo total não baterem.
+    """
+    if not isinstance(payload, dict) or payload.get("lesson_id") != lesson_id:
+        raise LessonResultError("resultado de outra lição")
+    results = payload.get("results")
+    if not isinstance(results, list) or len(results) != len(exercises):
+        raise LessonResultError("número de exercícios diferente")
+    if elapsed_ms < len(exercises) * min_ms:
+        raise LessonResultError("lição concluída rápido demais")
+    summary = []
+    for index, (exercise, result) in enumerate(zip(exercises, results)):
+        if not isinstance(result, dict) or result.get("index") != index:
+            raise LessonResultError(f"exercício {index} fora de ordem")
+        if result.get("response") != exercise["answer"]:
+            raise LessonResultError(f"resposta do exercício {index} não confere")
+        attempts, elapsed = result.get("attempts"), result.get("ms")
+        if not isinstance(attempts, int) or not 1 <= attempts <= MAX_ATTEMPTS:
+            raise LessonResultError(f"tentativas inválidas no exercício {index}")
+        if not isinstance(elapsed, (int, float)) or elapsed < min_ms:
+            raise LessonResultError(f"tempo inválido no exercício {index}")
+        summary.append({"attempts": attempts, "ms": int(elapsed)})
+    return summary
+
+
+def aggregate_stats(stats: dict, exercises: list, summary: list) -> dict:
+    """Soma o resultado em ``{tipo: {"exercises", "attempts", "ms"}}``.
+
+    Lições geradas têm id aleatório; guardar uma entrada por id faria o perfil
+    crescer sem limite, então elas entram só nos totais por tipo de exercício.
+    """
+    for exercise, result in zip(exercises, summary):
+        totals = stats.setdefault(exercise["type"], {"exercises": 0, "attempts": 0, "ms": 0})
+        totals["exercises"] += 1
+        totals["attempts"] += result["attempts"]
+        totals["ms"] += result["ms"]
+    return stats
@@ -0,0 +1,307 @@
+"""Geração de exercícios da Prática Mágica fora do fluxo do Streamlit."""
+
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+XP_BAND_SIZE = int(os.getenv("PRACTICE_XP_BAND", "100"))
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "3"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+
+PRACTICE_PROMPT = """
+    Gere 3 exercícios claros e completos para alunos de {lang} no estilo Duolingo.
+    Use apenas os tipos "select" e "arrange".
+    Regras:
+    - "select": prompt deve ter contexto (pergunta ou frase com ___), 3 a 4 opções, e "answer" deve ser exatamente uma das opções.
+    - "arrange": prompt deve pedir para montar uma frase; "words" são as palavras embaralhadas; "answer" é a lista na ordem correta.
+    Retorne SOMENTE JSON válido, sem markdown ou texto extra, seguindo o formato:
+    [
+      {{"type": "select", "prompt": "Complete: I ___ a teacher.", "options": ["am","is","are"], "answer": "am"}},
+      {{"type": "arrange", "prompt": "Monte: Eu estudo inglês à noite.", "words": ["estudo","Eu","noite","à","inglês"], "answer": ["Eu","estudo","inglês","à","noite"]}}
+    ]
+    Considere que o usuário tem {xp} XP para calibrar a dificuldade e traga instruções em uma frase completa.
+    """
+
+
+def xp_band(xp: int) -> int:
+    """Piso da faixa de XP; alunos na mesma faixa recebem exercícios do mesmo nível."""
+    return max(0, int(xp)) // XP_BAND_SIZE * XP_BAND_SIZE
+
+
+def build_practice_prompt(lang: str, xp: int) -> str:
+    return PRACTICE_PROMPT.format(lang=lang, xp=xp_band(xp))
+
+
+def normalize_exercise(item):
+    """Valida um item vindo da IA; devolve o exercício limpo ou ``None``."""
+    if not isinstance(item, dict):
+        return None
+    if item.get("type") not in {"select", "arrange"}:
+        return None
+    if "prompt" not in item or "answer" not in item:
+        return None
+    if item["type"] == "select" and "options" in item:
+        options = item["options"]
+        if not isinstance(options, list) or len(options) < 2:
+            return None
+        if item["answer"] not in options:
+            return None
+        return {
+            "type": "select",
+            "prompt": item["prompt"],
+            "options": options,
+            "answer": item["answer"],
+        }
+    if item["type"] == "arrange" and "words" in item:
+        words = item["words"]
+        if not isinstance(words, list) or len(words) < 2:
+            return None
+        return {
+            "type": "arrange",
+            "prompt": item["prompt"],
+            "words": words,
+            "answer": item["answer"],
+        }
+    return None
+
+
+class ExerciseStreamParser:
+    """Parser incremental da lista JSON de exercícios.
+
+    Recebe pedaços de texto com ``feed`` e devolve cada objeto do array assim
+    que ele fecha e passa pela validação. Texto antes do array (cercas de
+    código, "Claro! Aqui estão...") e depois dele é ignorado.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> list:
+        if self._done or not chunk:
+            return []
+        self._buffer += chunk
+        found = []
+        while self._pos < len(self._buffer) and not self._done:
+            if not self._in_array:
+                if not self._find_array():
+                    break
+                continue
+            char = self._buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self._done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start is not None:
+                        exercise = self._decode(self._buffer[self._object_start:self._pos + 1])
+                        self._object_start = None
+                        if exercise:
+                            found.append(exercise)
+            self._pos += 1
+        self._compact()
+        return found
+
+    def _find_array(self) -> bool:
+        """Procura um ``[`` que realmente abre a lista (seguido de ``{`` ou ``]``)."""
+        while True:
+            start = self._buffer.find("[", self._pos)
+            if start < 0:
+                self._pos = len(self._buffer)
+                return False
+            rest = self._buffer[start + 1:].lstrip()
+            if not rest:
+                self._pos = start  # espera o próximo pedaço para decidir
+                return False
+            if rest[0] in "{]":
+                self._in_array = True
+                self._pos = start + 1
+                return True
+            self._pos = start + 1
+
+    @staticmethod
+    def _decode(raw: str):
+        try:
+            return normalize_exercise(json.loads(raw))
+        except json.JSONDecodeError:
+            return None
+
+    def _compact(self) -> None:
+        # descarta o que já foi consumido, preservando um objeto ainda aberto
+        keep_from = self._object_start if self._object_start is not None else self._pos
+        if keep_from > 4096:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._object_start is not None:
+                self._object_start = 0
+
+
+def parse_ai_response(text: str):
+    parser = ExerciseStreamParser()
+    return parser.feed(text) or None
+
+
+def stream_exercises(client, lang: str, xp: int):
+    """Gera exercícios válidos conforme o modelo os transmite."""
+    parser = ExerciseStreamParser()
+    for chunk in client.generate_content(build_practice_prompt(lang, xp), stream=True):
+        yield from parser.feed(chunk.text or "")
+        if parser.done:
+            break
+
+
+class PracticeStream:
+    """Consome ``stream_exercises`` em segundo plano.
+
+    ``exercises`` cresce conforme chegam novos itens; a lição pode começar no
+    primeiro e o resto vai entrando na mesma lista.
+    """
+
+    def __init__(self, chunks, on_complete=None):
+        self.exercises = []
+        self.error = None
+        self.result = None
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._changed = threading.Condition()
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def first(self):
+        """Consome até o primeiro exercício válido na thread atual e segue o resto em segundo plano."""
+        try:
+            for exercise in self._chunks:
+                self.exercises.append(exercise)
+                break
+        except Exception as exc:  # pragma: no cover - rede/modelo externo
+            self.error = exc
+        if not self.exercises:
+            self._finish()
+            return None
+        threading.Thread(target=self._consume, name="practice-stream", daemon=True).start()
+        return self.exercises[0]
+
+    def wait_for(self, count: int, timeout: float) -> bool:
+        """Espera ter ``count`` exercícios (ou o fim do stream); diz se eles existem."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.exercises) >= count or self._done, timeout)
+            return len(self.exercises) >= count
+
+    def _consume(self) -> None:
+        try:
+            for exercise in self._chunks:
+                with self._changed:
+                    self.exercises.append(exercise)
+                    self._changed.notify_all()
+        except Exception as exc:  # pragma: no cover - rede/modelo externo
+            self.error = exc
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._on_complete is not None and self.exercises:
+            try:
+                self.result = self._on_complete(list(self.exercises))
+            except Exception:
+                self.result = None
+        with self._changed:
+            self._done = True
+            self._changed.notify_all()
+
+
+def generate_exercises(client, lang: str, xp: int):
+    """Chamada ao modelo; exceções de rede sobem para quem chamou."""
+    response = client.generate_content(build_practice_prompt(lang, xp))
+    return parse_ai_response(response.text)
+
+
+class PrefetchPool:
+    """Buffer de conjuntos de exercícios prontos por (chave de API, idioma, faixa de XP).
+
+    ``pop`` devolve um conjunto já validado na hora, se houver, e agenda a
+    reposição em threads de fundo usando o cliente de quem pediu. Cada chave
+    só consome conjuntos que ela mesma pagou. Profundidade do buffer e número
+    de workers vêm de ``PREFETCH_DEPTH``/``PREFETCH_WORKERS``.
+    """
+
+    def __init__(self, depth: int = PREFETCH_DEPTH, workers: int = PREFETCH_WORKERS,
+                 generate=generate_exercises):
+        self.depth = depth
+        self._generate = generate
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._buffers = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refills": 0, "failures": 0}
+
+    @staticmethod
+    def _key(client, lang: str, xp: int) -> tuple:
+        return getattr(client, "fingerprint", None), lang, xp_band(xp)
+
+    def pop(self, client, lang: str, xp: int):
+        key = self._key(client, lang, xp)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            exercises = buffer.popleft() if buffer else None
+            self.stats["hits" if exercises else "misses"] += 1
+        self.fill(client, lang, xp)
+        return exercises
+
+    def fill(self, client, lang: str, xp: int) -> int:
+        """Agenda gerações até completar o buffer da faixa; devolve quantas foram agendadas."""
+        if client is None or self.depth <= 0:
+            return 0
+        key = self._key(client, lang, xp)
+        with self._lock:
+            missing = self.depth - len(self._buffers.get(key, ())) - self._inflight.get(key, 0)
+            if missing <= 0:
+                return 0
+            self._inflight[key] = self._inflight.get(key, 0) + missing
+        for _ in range(missing):
+            self._executor.submit(self._refill, client, key)
+        return missing
+
+    def size(self, client, lang: str, xp: int) -> int:
+        return len(self._buffers.get(self._key(client, lang, xp), ()))
+
+    def _refill(self, client, key) -> None:
+        _, lang, band = key
+        try:
+            exercises = self._generate(client, lang, band)
+        except Exception:
+            exercises = None
+        with self._lock:
+            self._inflight[key] -= 1
+            if exercises:
+                self._buffers.setdefault(key, deque()).append(exercises)
+                self.stats["refills"] += 1
+            else:
+                self.stats["failures"] += 1
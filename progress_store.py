@@ -0,0 +1,260 @@
+"""Progresso dos alunos em disco, com gravação adiada em lotes.
+
+Perfis (XP, lições concluídas) ficam em SQLite (modo WAL), uma linha por
+aluno; o histórico do chat, uma linha por mensagem. ``save`` só atualiza um
+buffer em memória e volta na hora; uma thread de fundo grava tudo o que mudou
+em uma transação a cada ``PROGRESS_FLUSH_INTERVAL`` segundos (ou antes, se o
+buffer encher). O chat só recebe mensagens no fim, então cada ``save`` compara
+o tamanho de cada histórico com o já gravado e serializa só as mensagens
+novas. Retomar a sessão é uma leitura pela chave primária.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+PROGRESS_PATH = os.getenv(
+    "PROGRESS_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "progress.sqlite3"),
+)
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "1.0"))
+# alunos pendentes que antecipam a gravação do lote
+PROGRESS_BATCH_SIZE = int(os.getenv("PROGRESS_BATCH_SIZE", "200"))
+FIELDS = ("language", "profiles")
+CHAT_FIELD = "chat_history"
+
+
+class ProgressStore:
+    """Buffer de escrita por aluno na frente de uma tabela SQLite compartilhada pelos processos."""
+
+    def __init__(self, path: str = PROGRESS_PATH, flush_interval: float = PROGRESS_FLUSH_INTERVAL,
+                 batch_size: int = PROGRESS_BATCH_SIZE, clock=time.time):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self._clock = clock
+        self._pending = {}
+        self._wake = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS learners (
+                    learner_id TEXT PRIMARY KEY,
+                    language TEXT,
+                    profiles TEXT,
+                    chat_history TEXT,
+                    updated REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            # learners.chat_history fica só para migrar o formato antigo (um JSON por aluno)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    learner_id TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (learner_id, language, seq)
+                ) WITHOUT ROWID
+                """
+            )
+        # {(aluno, idioma): mensagens já enviadas ao buffer}; sem entrada, o próximo save regrava o idioma
+        self._chat_saved = {}
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, learner_id: str) -> dict | None:
+        """``{"language", "profiles", "chat_history"}`` do aluno, incluindo o que ainda não foi gravado."""
+        # sem lote em gravação no meio: ou está no buffer ou já está no disco
+        with self._write_lock:
+            with self._wake:
+                pending = dict(self._pending.get(learner_id, {}))
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT language, profiles, chat_history FROM learners WHERE learner_id = ?", (learner_id,)
+                ).fetchone()
+                if row is not None and row[2]:
+                    self._migrate_chat(conn, learner_id, json.loads(row[2]))
+                messages = conn.execute(
+                    "SELECT language, message FROM chat_messages WHERE learner_id = ? ORDER BY language, seq",
+                    (learner_id,),
+                ).fetchall()
+        if row is None and not pending and not messages:
+            return None
+        stored = dict(zip(FIELDS, row or (None, None)))
+        chat = pending.pop(CHAT_FIELD, {})
+        stored.update(pending)
+        history = {}
+        for lang, message in messages:
+            history.setdefault(lang, []).append(json.loads(message))
+        for lang, (start, rows) in chat.items():
+            history[lang] = history.get(lang, [])[:start] + [json.loads(message) for message in rows]
+        with self._wake:
+            for lang, lang_messages in history.items():
+                self._chat_saved[(learner_id, lang)] = len(lang_messages)
+        return {
+            "language": stored["language"],
+            "profiles": json.loads(stored["profiles"]) if stored["profiles"] else {},
+            "chat_history": history,
+        }
+
+    @staticmethod
+    def _migrate_chat(conn, learner_id: str, history: dict) -> None:
+        """Formato antigo: o chat inteiro numa coluna; vira uma linha por mensagem."""
+        conn.executemany(
+            "INSERT OR REPLACE INTO chat_messages (learner_id, language, seq, message) VALUES (?, ?, ?, ?)",
+            [
+                (learner_id, lang, seq, json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+                for lang, lang_messages in history.items()
+                for seq, message in enumerate(lang_messages)
+            ],
+        )
+        conn.execute("UPDATE learners SET chat_history = NULL WHERE learner_id = ?", (learner_id,))
+
+    def save(self, learner_id: str, language: str | None = None, profiles: dict | None = None,
+             chat_history: dict | None = None) -> None:
+        """Enfileira o estado do aluno; campos ``None`` ficam como estão no disco.
+
+        Do ``chat_history`` só vão as mensagens que ainda não foram enviadas.
+        """
+        # serializa já, na thread da sessão: o dict pode mudar antes do lote ser gravado
+        changes = {}
+        if language is not None:
+            changes["language"] = language
+        if profiles is not None:
+            changes["profiles"] = json.dumps(profiles, ensure_ascii=False, separators=(",", ":"))
+        with self._wake:
+            chat = self._chat_changes(learner_id, chat_history) if chat_history is not None else {}
+            if chat:
+                changes[CHAT_FIELD] = chat
+            if not changes:
+                return
+            self._pending[learner_id] = _merge(self._pending.get(learner_id, {}), changes)
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+
+    def _chat_changes(self, learner_id: str, chat_history: dict) -> dict:
+        """``{idioma: (início, [mensagens JSON])}`` com o que mudou desde o último ``save``."""
+        chat = {}
+        for lang, messages in chat_history.items():
+            saved = self._chat_saved.get((learner_id, lang))
+            if saved == len(messages):
+                continue
+            # idioma nunca visto neste processo ou histórico trocado: regrava o idioma inteiro
+            start = saved if saved is not None and saved < len(messages) else 0
+            rows = [json.dumps(message, ensure_ascii=False, separators=(",", ":")) for message in messages[start:]]
+            chat[lang] = (start, rows)
+            self._chat_saved[(learner_id, lang)] = len(messages)
+        return chat
+
+    def pending(self) -> int:
+        with self._wake:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Grava o buffer inteiro em uma transação; devolve quantos alunos foram gravados."""
+        with self._write_lock:
+            with self._wake:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            now = self._clock()
+            rows = [
+                (learner_id, *(changes.get(field) for field in FIELDS), now)
+                for learner_id, changes in batch.items()
+            ]
+            trimmed, messages = [], []
+            for learner_id, changes in batch.items():
+                for lang, (start, lang_rows) in changes.get(CHAT_FIELD, {}).items():
+                    trimmed.append((learner_id, lang, start))
+                    messages.extend((learner_id, lang, start + offset, row) for offset, row in enumerate(lang_rows))
+            try:
+                with self._connect() as conn:
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executemany(
+                        """
+                        INSERT INTO learners (learner_id, language, profiles, updated)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT (learner_id) DO UPDATE SET
+                            language = COALESCE(excluded.language, learners.language),
+                            profiles = COALESCE(excluded.profiles, learners.profiles),
+                            updated = excluded.updated
+                        """,
+                        rows,
+                    )
+                    # só há algo a partir de ``início`` quando o histórico foi regravado
+                    conn.executemany(
+                        "DELETE FROM chat_messages WHERE learner_id = ? AND language = ? AND seq >= ?", trimmed
+                    )
+                    conn.executemany(
+                        "INSERT INTO chat_messages (learner_id, language, seq, message) VALUES (?, ?, ?, ?)",
+                        messages,
+                    )
+            except sqlite3.Error:
+                # devolve o lote ao buffer sem passar por cima do que chegou depois
+                with self._wake:
+                    for learner_id, changes in batch.items():
+                        self._pending[learner_id] = _merge(changes, self._pending.get(learner_id, {}))
+                raise
+            return len(rows)
+
+    def close(self) -> None:
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self) -> None:
+        failed = False
+        while True:
+            with self._wake:
+                if not self._closed and (failed or len(self._pending) < self.batch_size):
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+                failed = False
+            except sqlite3.Error:
+                # banco travado por outro processo: o lote voltou ao buffer, tenta no próximo ciclo
+                failed = True
+            if closed:
+                return
+
+
+def _merge(older: dict, newer: dict) -> dict:
+    """Junta duas alterações pendentes do mesmo aluno; mensagens novas do chat vão depois das antigas."""
+    merged = {**older, **newer}
+    chat = dict(older.get(CHAT_FIELD, {}))
+    for lang, (start, rows) in newer.get(CHAT_FIELD, {}).items():
+        if lang in chat and chat[lang][0] + len(chat[lang][1]) == start:
+            chat[lang] = (chat[lang][0], chat[lang][1] + rows)
+        elif lang in chat and start > chat[lang][0]:
+            old_start, old_rows = chat[lang]
+            chat[lang] = (old_start, old_rows[:start - old_start] + rows)
+        else:
+            chat[lang] = (start, rows)
+    if chat:
+        merged[CHAT_FIELD] = chat
+    return merged
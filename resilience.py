@@ -0,0 +1,396 @@
+"""Prazos, retentativas, requisições hedge e circuit breaker para o Gemini.
+
+``Resilience.wrap`` devolve um cliente com o mesmo ``generate_content`` do
+SDK. Cada chamada tem um prazo total; erros transitórios (429/5xx/timeout)
+são repetidos com backoff exponencial e jitter; chamadas interativas que
+passam do p95 recente ganham uma segunda requisição em paralelo; e, com o
+provedor degradado, o breaker falha na hora para o app usar o plano B.
+
+Streams repetem só até o primeiro pedaço; depois cada pedaço tem prazo
+próprio (``RESILIENCE_STREAM_CHUNK_TIMEOUT``) além do prazo total. O tempo até
+o primeiro pedaço e a duração do stream ficam em séries à parte
+(``<carga>/ttft`` e ``<carga>/stream``) e não entram no p95 do hedge.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from stream_relay import END, StreamStalled, relay_stream
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+DEADLINES = {
+    "tutor": float(os.getenv("RESILIENCE_DEADLINE_TUTOR", "20")),
+    "practice": float(os.getenv("RESILIENCE_DEADLINE_PRACTICE", "30")),
+    "prefetch": float(os.getenv("RESILIENCE_DEADLINE_PREFETCH", "60")),
+    "summary": float(os.getenv("RESILIENCE_DEADLINE_SUMMARY", "30")),
+}
+HEDGED_WORKLOADS = {"tutor", "practice"}
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "4"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") != "0"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+QUOTA_COOLDOWN = float(os.getenv("QUOTA_COOLDOWN", "60"))
+STREAM_CHUNK_TIMEOUT = float(os.getenv("RESILIENCE_STREAM_CHUNK_TIMEOUT", "10"))
+
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "GatewayTimeout",
+    "TooManyRequests",
+    "FakeBackendError",
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """A chamada não terminou dentro do prazo total."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Provedor marcado como degradado; a chamada nem foi feita."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in _RETRYABLE_NAMES:
+        return True
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)  # grpc.StatusCode vem como enum
+    return isinstance(code, int) and code in _RETRYABLE_CODES
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """429/ResourceExhausted: a cota da chave acabou (ou o limite por minuto estourou)."""
+    if type(exc).__name__ in {"ResourceExhausted", "TooManyRequests"}:
+        return True
+    code = getattr(exc, "code", None)
+    return getattr(code, "value", code) == 429
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Backoff exponencial com jitter (metade fixa, metade sorteada)."""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float | None:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Abre depois de ``failures`` falhas transitórias seguidas; após ``cooldown`` deixa uma sonda passar."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN, clock=time.monotonic):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._state = BREAKER_CLOSED
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == BREAKER_OPEN and self._clock() - self._opened_at >= self.cooldown:
+                return BREAKER_HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == BREAKER_CLOSED:
+                return True
+            if self._clock() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True  # meia-abertura: uma chamada de teste por vez
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._probing = False
+            self._state = BREAKER_CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or self._consecutive >= self.failures:
+                if self._state != BREAKER_OPEN or self._probing:
+                    self.trips += 1
+                self._state = BREAKER_OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class Resilience:
+    """Estado compartilhado do processo: breakers por chave, latências por carga e contadores."""
+
+    def __init__(self, observer=None):
+        """``observer(modelo, chave, carga, latência, ok)`` recebe o resultado de cada chamada.
+
+        ``chave`` é o fingerprint da chave de API. Erros de cota ou de limite
+        de taxa (429) são da chave, não do modelo, e não são repassados.
+        """
+        self._observer = observer
+        self._breakers = {}
+        self._trackers = {}
+        self._quota_until = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="resilience")
+        self.stats = {
+            "calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+            "timeouts": 0, "short_circuits": 0, "failures": 0,
+        }
+
+    def breaker(self, fingerprint: str | None) -> CircuitBreaker:
+        key = fingerprint or "default"
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker()
+            return self._breakers[key]
+
+    def tracker(self, workload: str) -> LatencyTracker:
+        with self._lock:
+            if workload not in self._trackers:
+                self._trackers[workload] = LatencyTracker()
+            return self._trackers[workload]
+
+    def quota_exhausted(self, fingerprint: str | None) -> bool:
+        """A chave recebeu 429 há menos de ``QUOTA_COOLDOWN`` segundos."""
+        with self._lock:
+            return self._quota_until.get(fingerprint or "default", 0.0) > time.monotonic()
+
+    def _record_quota(self, fingerprint: str | None) -> None:
+        with self._lock:
+            self._quota_until[fingerprint or "default"] = time.monotonic() + QUOTA_COOLDOWN
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+            trackers = dict(self._trackers)
+        return {
+            "breakers": {key[:8]: {"state": breaker.state, "trips": breaker.trips} for key, breaker in breakers.items()},
+            "p95": {workload: tracker.percentile(0.95) for workload, tracker in trackers.items()},
+            **self.stats,
+        }
+
+    def wrap(self, client, workload: str):
+        return ResilientClient(self, client, workload) if client is not None else None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _submit(self, client, contents, kwargs: dict, deadline: float, hedge: bool = False):
+        submit = getattr(client, "submit", None)
+        if submit is not None:
+            # hedge não pode ser coalescido com a requisição original no gateway
+            return submit(contents, coalesce=not hedge, deadline=deadline, **kwargs)
+        if kwargs.get("stream"):
+            future = Future()
+            self._executor.submit(self._stream_direct, future, client, contents, kwargs, deadline)
+            return future
+        return self._executor.submit(self._call_direct, client, contents, kwargs, deadline)
+
+    def _stream_direct(self, future: Future, client, contents, kwargs: dict, deadline: float) -> None:
+        """Sem gateway: entrega o relay ao abrir e segue lendo nesta thread do executor."""
+        if not future.set_running_or_notify_cancel():
+            return
+
+        def deliver(relay):
+            if future.cancelled():
+                relay.close()
+            else:
+                future.set_result(relay)
+
+        try:
+            relay_stream(lambda: self._call_direct(client, contents, kwargs, deadline), deliver)
+        except Exception as exc:
+            future.set_exception(exc)
+
+    @staticmethod
+    def _call_direct(client, contents, kwargs: dict, deadline: float):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("prazo esgotado antes da chamada")
+        # o SDK cancela a chamada no prazo: a thread não fica presa depois que desistimos
+        return client.generate_content(contents, timeout=remaining, **kwargs)
+
+    def call(self, client, workload: str, contents, **kwargs):
+        breaker = self.breaker(getattr(client, "fingerprint", None))
+        self._count("calls")
+        if not breaker.allow():
+            self._count("short_circuits")
+            raise CircuitOpenError("Gemini indisponível no momento")
+        deadline = time.monotonic() + DEADLINES.get(workload, DEADLINES["practice"])
+        if kwargs.get("stream"):
+            return self._stream(client, workload, contents, kwargs, breaker, deadline)
+        tracker = self.tracker(workload)
+        hedge_after = None
+        if HEDGE_ENABLED and workload in HEDGED_WORKLOADS and len(tracker) >= HEDGE_MIN_SAMPLES:
+            hedge_after = tracker.percentile(0.95)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = self._attempt(client, contents, kwargs, deadline, hedge_after)
+            except Exception as exc:
+                attempt = self._after_failure(client, workload, breaker, exc, attempt, deadline)
+                continue
+            elapsed = time.monotonic() - started
+            tracker.record(elapsed)
+            breaker.record_success()
+            self._observe(client, workload, elapsed, True)
+            return result
+
+    def _after_failure(self, client, workload: str, breaker: CircuitBreaker, exc: Exception,
+                       attempt: int, deadline: float) -> int:
+        """Registra a falha; relança ``exc`` ou espera o backoff e devolve o número da próxima tentativa."""
+        retryable = is_retryable(exc)
+        if retryable:
+            breaker.record_failure()
+            if not is_quota_error(exc):
+                self._observe(client, workload, None, False)
+        else:
+            breaker.record_success()  # erro do pedido, não do provedor
+        if is_quota_error(exc):
+            self._record_quota(getattr(client, "fingerprint", None))
+        delay = backoff_delay(attempt)
+        attempt += 1
+        if not retryable or attempt >= RETRY_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+            self._count("failures")
+            raise exc
+        if not breaker.allow():
+            self._count("short_circuits")
+            raise CircuitOpenError("Gemini indisponível no momento") from exc
+        self._count("retries")
+        time.sleep(delay)
+        return attempt
+
+    def _stream(self, client, workload: str, contents, kwargs: dict, breaker: CircuitBreaker, deadline: float):
+        """Abre o stream, repetindo até o primeiro pedaço, e devolve um gerador com prazo por pedaço."""
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            relay = None
+            try:
+                relay = self._attempt(client, contents, kwargs, deadline, None)
+                first = self._next_chunk(relay, deadline)
+            except Exception as exc:
+                if relay is not None:
+                    relay.close()
+                attempt = self._after_failure(client, workload, breaker, exc, attempt, deadline)
+                continue
+            break
+        breaker.record_success()
+        self.tracker(f"{workload}/ttft").record(time.monotonic() - started)
+        return self._relay(client, workload, relay, first, started, breaker, deadline)
+
+    def _relay(self, client, workload: str, relay, chunk, started: float, breaker: CircuitBreaker, deadline: float):
+        """Repassa os pedaços; resultado e duração só contam quando o stream termina."""
+        finished = False
+        try:
+            while chunk is not END:
+                yield chunk
+                chunk = self._next_chunk(relay, deadline)
+            finished = True
+        except Exception as exc:
+            # já entregamos pedaços: sem retentativa, só registra a falha
+            self._count("failures")
+            if is_retryable(exc):
+                breaker.record_failure()
+                if not is_quota_error(exc):
+                    self._observe(client, workload, None, False)
+            raise
+        finally:
+            relay.close()  # quem consome desistiu ou acabou: a thread do gateway para de ler
+            if finished:
+                elapsed = time.monotonic() - started
+                self.tracker(f"{workload}/stream").record(elapsed)
+                self._observe(client, workload, elapsed, True)
+
+    def _next_chunk(self, relay, deadline: float):
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise StreamStalled("prazo total do stream esgotado")
+            return relay.get(min(STREAM_CHUNK_TIMEOUT, remaining))
+        except StreamStalled:
+            self._count("timeouts")
+            raise DeadlineExceeded("Gemini parou de transmitir dentro do prazo") from None
+
+    def _observe(self, client, workload: str, latency: float | None, ok: bool) -> None:
+        if self._observer is not None:
+            self._observer(
+                getattr(client, "model_name", None), getattr(client, "fingerprint", None), workload, latency, ok
+            )
+
+    def _attempt(self, client, contents, kwargs: dict, deadline: float, hedge_after: float | None):
+        primary = self._submit(client, contents, kwargs, deadline)
+        pending = {primary}
+        if hedge_after is not None and not kwargs.get("stream"):
+            done, _ = wait(pending, timeout=min(hedge_after, max(0.0, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline:
+                self._count("hedges")
+                pending.add(self._submit(client, contents, kwargs, deadline, hedge=True))
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+            if not pending:
+                raise next(iter(done)).exception()
+        for future in pending:
+            future.cancel()
+        self._count("timeouts")
+        raise DeadlineExceeded("Gemini não respondeu dentro do prazo")
+
+
+class ResilientClient:
+    def __init__(self, resilience: Resilience, client, workload: str):
+        self._resilience = resilience
+        self._client = client
+        self.workload = workload
+        self.model_name = getattr(client, "model_name", None)
+        self.fingerprint = getattr(client, "fingerprint", None)
+
+    def generate_content(self, contents, **kwargs):
+        return self._resilience.call(self._client, self.workload, contents, **kwargs)
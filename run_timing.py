@@ -0,0 +1,45 @@
+"""Tempo de execução do script por interação, separado por escopo.
+
+``app`` mede a execução inteira de ``main()``; cada fragmento mede só o
+próprio corpo. Comparar os dois mostra quanto uma interação dentro do
+fragmento economiza em relação a rodar o app todo.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+TIMING_WINDOW = 500
+
+
+class RunTimings:
+    def __init__(self, window: int = TIMING_WINDOW):
+        self._window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, scope: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(scope, time.perf_counter() - started)
+
+    def record(self, scope: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(scope, deque(maxlen=self._window)).append(seconds)
+
+    def summary(self) -> dict:
+        """``{escopo: {"runs", "p50_ms", "p95_ms"}}`` sobre a janela recente."""
+        with self._lock:
+            samples = {scope: sorted(values) for scope, values in self._samples.items()}
+        return {
+            scope: {
+                "runs": len(values),
+                "p50_ms": round(values[len(values) // 2] * 1000, 1),
+                "p95_ms": round(values[min(len(values) - 1, int(0.95 * len(values)))] * 1000, 1),
+            }
+            for scope, values in samples.items()
+        }
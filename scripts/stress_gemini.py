@@ -0,0 +1,129 @@
+"""Estressa o pool com várias chaves em paralelo.
+
+Uso: ``python scripts/stress_gemini.py [sessões] [chamadas por sessão] [latência]``
+
+Primeiro com o backend falso, depois com o caminho real de ``build_model``:
+o transporte do SDK (``glm.GenerativeServiceClient``) é trocado por um que
+guarda a chave com que foi criado e responde com ela, sem rede. Falha se
+alguma resposta voltar com a chave de outra sessão, se algum transporte for
+criado sem a chave da sessão (ex.: volta do ``genai.configure`` global) ou
+se as chamadas não rodarem em paralelo.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import FakeConfig, fake_factory  # noqa: E402
+import gemini  # noqa: E402
+from gemini import ClientPool, build_model, key_fingerprint, model_candidates  # noqa: E402
+
+
+def run_session(pool: ClientPool, api_key: str, calls: int) -> int:
+    expected = f"[{key_fingerprint(api_key)[:12]}]"
+    mismatches = 0
+    for turn in range(calls):
+        client = pool.get(api_key)
+        # alterna os dois formatos usados pelo app: prática mágica e tutor
+        if turn % 2:
+            contents = "Gere 3 exercícios"
+        else:
+            contents = [{"role": "user", "parts": "sistema"}, {"role": "user", "parts": "oi"}]
+        if not client.generate_content(contents).text.startswith(expected):
+            mismatches += 1
+    return mismatches
+
+
+class RecordingTransport:
+    """Faz o papel de ``glm.GenerativeServiceClient``: responde com a impressão digital da própria chave."""
+
+    latency = 0.0
+    _lock = threading.Lock()
+    built = []
+
+    def __init__(self, client_options=None, **kwargs):
+        if isinstance(client_options, dict):
+            api_key = client_options.get("api_key")
+        else:
+            api_key = getattr(client_options, "api_key", None)
+        self.fingerprint = key_fingerprint(api_key) if api_key else None
+        with self._lock:
+            self.built.append(self.fingerprint)
+
+    def generate_content(self, request, **kwargs):
+        time.sleep(self.latency)
+        part = gemini.glm.Part(text=f"[{(self.fingerprint or 'sem-chave')[:12]}] ok")
+        candidate = gemini.glm.Candidate(content=gemini.glm.Content(parts=[part], role="model"), finish_reason=1)
+        return gemini.glm.GenerateContentResponse(candidates=[candidate])
+
+
+def run_sdk_session(pool: ClientPool, api_key: str, calls: int) -> int:
+    expected = f"[{key_fingerprint(api_key)[:12]}]"
+    candidates = model_candidates()
+    mismatches = 0
+    for turn in range(calls):
+        # alterna modelos: irmãos de ``for_model`` precisam usar o mesmo transporte da chave
+        client = pool.get(api_key).for_model(candidates[turn % len(candidates)])
+        if not client.generate_content("oi").text.startswith(expected):
+            mismatches += 1
+    return mismatches
+
+
+def check_sdk_isolation(sessions: int, calls: int, latency: float) -> int:
+    """Roda ``build_model`` de verdade com várias chaves em threads; devolve o número de falhas."""
+    if gemini.genai is None:
+        print("google-generativeai não instalado; pulando o teste com build_model")
+        return 0
+    RecordingTransport.latency = latency
+    RecordingTransport.built = []
+    keys = [f"sdk-key-{index % (sessions // 2 or 1)}" for index in range(sessions)]
+    with mock.patch.object(gemini.glm, "GenerativeServiceClient", RecordingTransport):
+        pool = ClientPool(factory=build_model)
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            mismatches = sum(executor.map(lambda key: run_sdk_session(pool, key, calls), keys))
+    expected = {key_fingerprint(key) for key in keys}
+    built = RecordingTransport.built
+    foreign = [fingerprint for fingerprint in built if fingerprint not in expected]
+    print(f"build_model: {len(built)} transportes para {len(expected)} chaves, respostas com chave trocada: {mismatches}")
+    if foreign:
+        print(f"transportes criados sem a chave da sessão: {len(foreign)}")
+    if len(built) != len(expected):
+        print("cada chave deveria ter exatamente um transporte")
+        return mismatches + len(foreign) + 1
+    return mismatches + len(foreign)
+
+
+def main(sessions: int = 50, calls: int = 10, latency: float = 0.02) -> int:
+    pool = ClientPool(factory=fake_factory(FakeConfig(latency=f"fixed:{latency}")))
+    keys = [f"fake-key-{index % (sessions // 2 or 1)}" for index in range(sessions)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        mismatches = sum(executor.map(lambda key: run_session(pool, key, calls), keys))
+    elapsed = time.perf_counter() - started
+    serial = sessions * calls * latency
+    print(f"{sessions * calls} chamadas, {len(pool)} clientes, {elapsed:.2f}s (serial seria {serial:.2f}s)")
+    print(f"respostas com chave trocada: {mismatches}")
+    if mismatches:
+        return 1
+    if elapsed > serial / 2:
+        print("chamadas foram serializadas")
+        return 1
+    if check_sdk_isolation(sessions, calls, latency):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(
+        main(
+            int(args[0]) if len(args) > 0 else 50,
+            int(args[1]) if len(args) > 1 else 10,
+            float(args[2]) if len(args) > 2 else 0.02,
+        )
+    )
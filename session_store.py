@@ -0,0 +1,265 @@
+"""Estado da sessão fora do processo, para qualquer worker atender qualquer aluno.
+
+As chaves de ``SHARED_KEYS`` (tela atual, lição em andamento, perfis, chat...)
+vão para um backend compartilhado escolhido em ``SESSION_BACKEND``: ``sqlite``
+(arquivo local, serve para vários processos na mesma máquina ou um disco
+compartilhado), ``memory`` (só o processo atual) ou ``off``. Cada valor é JSON
+compacto, comprimido com zlib quando passa de ``COMPRESS_OVER`` bytes. Ao fim
+de cada execução só as chaves que mudaram desde a última gravação são
+escritas. O chat, que só cresce, não é serializado inteiro a cada execução:
+cada idioma vira partes ``chat_history/<idioma>/<início>`` e só as mensagens
+novas são gravadas. Chaves de API nunca saem do processo.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_STORE_PATH = os.getenv(
+    "SESSION_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3"),
+)
+# sessões sem gravação há mais tempo que isso são apagadas
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(30 * 24 * 3600)))
+COMPRESS_OVER = 512
+SHARED_KEYS = (
+    "view",
+    "language",
+    "profiles",
+    "chat_history",
+    "chat_window",
+    "current_lesson",
+    "current_exercise_index",
+    "arrange_pool",
+    "arrange_answer",
+    "arrange_key",
+    "last_feedback",
+    "seen_practice_sets",
+    "seen_bank_exercises",
+    "tutor_context",
+    "celebrate",
+)
+DIGESTS_KEY = "_session_store_digests"
+CHAT_KEY = "chat_history"
+# {idioma: [mensagens gravadas, [início de cada parte]]}
+CHAT_SYNCED_KEY = "_session_store_chat"
+CHAT_PREFIX = f"{CHAT_KEY}/"
+# partes por idioma antes de regravar o histórico numa só
+MAX_CHAT_CHUNKS = 32
+
+
+def encode(value) -> bytes:
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) > COMPRESS_OVER:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def decode(blob: bytes):
+    blob = bytes(blob)
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(raw)
+
+
+class MemorySessionBackend:
+    """Backend do próprio processo; útil em desenvolvimento ou com sessões fixas."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> dict:
+        with self._lock:
+            return dict(self._sessions.get(session_id, {}))
+
+    def write(self, session_id: str, changed: dict, removed=()) -> None:
+        with self._lock:
+            values = self._sessions.setdefault(session_id, {})
+            values.update(changed)
+            for key in removed:
+                values.pop(key, None)
+
+
+class SQLiteSessionBackend:
+    """Uma linha por ``(sessão, chave)`` em SQLite (modo WAL), compartilhada pelos processos."""
+
+    def __init__(self, path: str = SESSION_STORE_PATH, ttl: float = SESSION_TTL, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_values (
+                    session_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (session_id, key)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_session_updated ON session_values (updated)")
+            conn.execute("DELETE FROM session_values WHERE updated < ?", (self._clock() - self.ttl,))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, session_id: str) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, value FROM session_values WHERE session_id = ?", (session_id,)).fetchall()
+        return {key: value for key, value in rows}
+
+    def write(self, session_id: str, changed: dict, removed=()) -> None:
+        now = self._clock()
+        with self._connect() as conn:
+            # WAL + NORMAL: o commit não espera fsync, só o checkpoint
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executemany(
+                """
+                INSERT INTO session_values (session_id, key, value, updated) VALUES (?, ?, ?, ?)
+                ON CONFLICT (session_id, key) DO UPDATE SET value = excluded.value, updated = excluded.updated
+                """,
+                [(session_id, key, value, now) for key, value in changed.items()],
+            )
+            conn.executemany(
+                "DELETE FROM session_values WHERE session_id = ? AND key = ?",
+                [(session_id, key) for key in removed],
+            )
+
+
+def backend_factory(backend: str = SESSION_BACKEND):
+    """Backend escolhido em ``SESSION_BACKEND``; ``None`` desliga o estado compartilhado.
+
+    Qualquer objeto com ``load(session_id) -> {chave: bytes}`` e
+    ``write(session_id, changed, removed)`` serve (ex.: um cliente Redis).
+    """
+    if backend == "sqlite":
+        return SQLiteSessionBackend()
+    if backend == "memory":
+        return MemorySessionBackend()
+    if backend == "off":
+        return None
+    raise ValueError(f"SESSION_BACKEND desconhecido: {backend}")
+
+
+def _digest(blob: bytes) -> str:
+    return hashlib.blake2b(blob, digest_size=8).hexdigest()
+
+
+def _chunk_key(lang: str, start: int) -> str:
+    return f"{CHAT_PREFIX}{lang}/{start}"
+
+
+class SessionSync:
+    """Liga ``st.session_state`` ao backend: carrega no começo da sessão e grava só o que mudou."""
+
+    def __init__(self, backend, keys=SHARED_KEYS):
+        self.backend = backend
+        self.keys = tuple(keys)
+
+    def hydrate(self, session_id: str, state) -> bool:
+        """Copia o estado salvo para ``state``; devolve ``False`` se a sessão não existe no backend."""
+        stored = self.backend.load(session_id)
+        digests = {}
+        chunks = {}
+        for key, blob in stored.items():
+            if key.startswith(CHAT_PREFIX) and CHAT_KEY in self.keys:
+                lang, _, start = key[len(CHAT_PREFIX):].rpartition("/")
+                chunks.setdefault(lang, []).append((int(start), decode(blob)))
+            elif key in self.keys:
+                state[key] = decode(blob)
+                # chat no formato antigo (um valor só) é regravado em partes no próximo sync
+                digests[key] = _digest(bytes(blob))
+        synced = {}
+        if chunks:
+            history = {}
+            for lang, parts in chunks.items():
+                parts.sort(key=lambda part: part[0])
+                messages = []
+                for start, part in parts:
+                    messages[start:] = part
+                history[lang] = messages
+                synced[lang] = [len(messages), [start for start, _ in parts]]
+            state[CHAT_KEY] = history
+        state[DIGESTS_KEY] = digests
+        state[CHAT_SYNCED_KEY] = synced
+        return bool(digests or synced)
+
+    def sync(self, session_id: str, state) -> int:
+        """Grava as chaves alteradas desde a última chamada; devolve quantas foram escritas."""
+        digests = state.get(DIGESTS_KEY)
+        if digests is None:
+            digests = state[DIGESTS_KEY] = {}
+        changed = {}
+        fresh = {}
+        for key in self.keys:
+            if key not in state or key == CHAT_KEY:
+                continue
+            blob = encode(state[key])
+            digest = _digest(blob)
+            if digests.get(key) != digest:
+                changed[key] = blob
+                fresh[key] = digest
+        removed = [key for key in digests if key not in state or key == CHAT_KEY]
+        chat = self._chat_changes(state, changed, removed) if CHAT_KEY in self.keys else {}
+        if not changed and not removed:
+            return 0
+        self.backend.write(session_id, changed, removed)
+        # só depois de gravar: se o backend falhar, a próxima execução tenta de novo
+        digests.update(fresh)
+        for key in removed:
+            digests.pop(key, None)
+        synced = state[CHAT_SYNCED_KEY]
+        for lang, entry in chat.items():
+            if entry is None:
+                synced.pop(lang, None)
+            else:
+                synced[lang] = entry
+        return len(changed) + len(removed)
+
+    @staticmethod
+    def _chat_changes(state, changed: dict, removed: list) -> dict:
+        """Partes novas do chat em ``changed``/``removed``; devolve o que fica gravado por idioma.
+
+        Compara só o tamanho de cada histórico com o já gravado, sem serializar
+        as mensagens antigas: o chat só recebe mensagens no fim.
+        """
+        history = state.get(CHAT_KEY) or {}
+        synced = state.get(CHAT_SYNCED_KEY)
+        if synced is None:
+            synced = state[CHAT_SYNCED_KEY] = {}
+        fresh = {}
+        for lang, messages in history.items():
+            count, starts = synced.get(lang, (0, []))
+            if len(messages) == count and starts:
+                continue
+            if len(messages) < count or len(starts) >= MAX_CHAT_CHUNKS:
+                # histórico trocado ou partes demais: regrava numa parte só
+                removed.extend(_chunk_key(lang, start) for start in starts if start)
+                changed[_chunk_key(lang, 0)] = encode(messages)
+                fresh[lang] = [len(messages), [0]]
+            else:
+                changed[_chunk_key(lang, count)] = encode(messages[count:])
+                fresh[lang] = [len(messages), [*starts, count]]
+        for lang, (_, starts) in synced.items():
+            if lang not in history:
+                removed.extend(_chunk_key(lang, start) for start in starts)
+                fresh[lang] = None
+        return fresh
@@ -0,0 +1,72 @@
+"""Repasse de respostas em streaming entre a thread que lê o SDK e quem consome.
+
+A thread que abriu o stream (do gateway ou da resiliência) continua lendo os
+pedaços até o fim e os entrega por uma fila; assim a vaga dela só é liberada
+quando o último token chega. Quem consome espera cada pedaço com prazo e pode
+desistir com ``close``, o que faz a thread parar de ler.
+"""
+
+import queue
+import threading
+
+END = object()
+
+
+class StreamStalled(TimeoutError):
+    """Nenhum pedaço chegou dentro do prazo pedido."""
+
+
+class _Failure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class StreamRelay:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def pump(self, chunks) -> None:
+        """Lê ``chunks`` até o fim (ou até ``close``); erros vão para quem consome."""
+        try:
+            for chunk in chunks:
+                if self._closed.is_set():
+                    break
+                self._queue.put(chunk)
+        except Exception as exc:
+            self._queue.put(_Failure(exc))
+        finally:
+            self._queue.put(END)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def get(self, timeout: float | None = None):
+        """Próximo pedaço, ou ``END``; ``StreamStalled`` se nada chegar em ``timeout`` segundos."""
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            raise StreamStalled("stream parado: nenhum pedaço dentro do prazo") from None
+        if isinstance(item, _Failure):
+            raise item.exc
+        return item
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+def relay_stream(start, on_open) -> None:
+    """Abre o stream com ``start()``, entrega o ``StreamRelay`` a ``on_open`` e segue lendo nesta thread.
+
+    Erros ao abrir sobem para quem chamou; depois de aberto, vão pelo relay.
+    """
+    chunks = start()
+    relay = StreamRelay()
+    on_open(relay)
+    relay.pump(chunks)
@@ -0,0 +1,41 @@
+"""Tema do app como arquivo estático versionado pelo conteúdo.
+
+``components/theme/theme.css`` é servido pelo Streamlit como arquivo do
+componente (``Cache-Control: public``) em ``theme.css?v=<hash>``. Um
+componente mínimo põe o ``<link>`` no ``<head>`` da página uma vez por sessão
+do navegador e confirma; daí em diante os reruns não mandam CSS nenhum.
+Mudar o CSS muda o hash e o navegador baixa a versão nova. ``THEME_ASSET=0``
+volta ao ``<style>`` inline a cada rerun.
+"""
+
+import hashlib
+import os
+
+import streamlit.components.v1 as components
+
+from component_protocol import install_protocol
+
+THEME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "theme")
+THEME_PATH = os.path.join(THEME_DIR, "theme.css")
+THEME_ASSET = os.getenv("THEME_ASSET", "1") != "0"
+
+with open(THEME_PATH, "rb") as _handle:
+    THEME_CSS = _handle.read().decode("utf-8")
+THEME_VERSION = hashlib.sha256(THEME_CSS.encode("utf-8")).hexdigest()[:12]
+THEME_HREF = f"theme.css?v={THEME_VERSION}"
+
+_component = components.declare_component("lingo_theme", path=THEME_DIR)
+_protocol_ready = install_protocol(THEME_DIR)
+
+
+def theme_asset_available() -> bool:
+    return THEME_ASSET and _protocol_ready and os.path.exists(os.path.join(THEME_DIR, "index.html"))
+
+
+def inline_style() -> str:
+    return f"<style>{THEME_CSS}</style>"
+
+
+def theme_loader(key: str, on_loaded=None, args=()):
+    """Carrega o tema na página; ``st.session_state[key]`` recebe ``{"version", "ok"}``."""
+    return _component(href=THEME_HREF, version=THEME_VERSION, key=key, default=None, on_change=on_loaded, args=args)
@@ -0,0 +1,183 @@
+"""Cache de respostas do tutor por similaridade, sem serviço externo de embeddings.
+
+Perguntas normalizadas viram palavras. Tirando as palavras de moldura ("how do
+I", "como se diz", "diferença entre"...), as palavras de conteúdo e seus pares
+vizinhos formam os shingles; assinaturas MinHash com LSH em bandas encontram
+candidatos e a similaridade de Jaccard exata decide se a resposta guardada
+serve. Uma troca de palavra de conteúdo ("past tense of go" x "of do",
+"cachorro" x "cachorra") veta o acerto mesmo com Jaccard alto.
+
+Só entram respostas de primeira pergunta da conversa, montadas sem histórico
+nem resumo do aluno: o cache é do processo e não pode vazar uma conversa para
+outra.
+"""
+
+import hashlib
+import os
+import random
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+CACHE_THRESHOLD = float(os.getenv("TUTOR_CACHE_THRESHOLD", "0.6"))
+CACHE_MAX_PER_LANGUAGE = int(os.getenv("TUTOR_CACHE_MAX", "2000"))
+# respostas a "sim", "ok", "e agora?" dependem da conversa; não entram no cache
+CACHE_MIN_CHARS = int(os.getenv("TUTOR_CACHE_MIN_CHARS", "10"))
+NUM_PERMUTATIONS = 64
+# bandas de 2 linhas: perguntas curtas com Jaccard 0.5 já viram candidatas
+LSH_BANDS = 32
+# moldura de pergunta, pronomes, conectivos e restos de contrações ("what's" -> "what s"), já sem acentos
+FRAME_WORDS = frozenset(
+    """
+    a an the how what which who do does did can could would should will is are am be to of for in on at please
+    i you me my we it this that say tell word mean means meaning difference between vs versus x or and s m re ve ll d
+    o os as um uma uns umas como que qual quais quem se eu voce tu meu minha e ou de do da dos das em no na nos
+    nas por para pra favor diz dizer digo fala falar significa significado diferenca entre palavra
+    el la los las un unas unos cual cuales es del en y dice decir yo usted mi diferencia palabra
+    """.split()
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # semente fixa: assinaturas iguais entre processos
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_prompt(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", without_accents).split())
+
+
+def content_words(words: list) -> list:
+    return [word for word in words if word not in FRAME_WORDS]
+
+
+def shingles(content: list) -> frozenset:
+    """Palavras de conteúdo e pares vizinhos delas."""
+    pairs = (f"{left} {right}" for left, right in zip(content, content[1:]))
+    return frozenset([*content, *pairs])
+
+
+def minhash(items: frozenset) -> tuple:
+    hashes = [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big") for item in items]
+    return tuple(min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(left: frozenset, right: frozenset) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def substituted(left: frozenset, right: frozenset) -> bool:
+    """Uma palavra de conteúdo de um lado foi trocada por outra palavra do outro lado."""
+    only_left, only_right = left - right, right - left
+    return bool((only_left - FRAME_WORDS and only_right) or (only_right - FRAME_WORDS and only_left))
+
+
+class _Partition:
+    """Entradas de um idioma: LRU + tabelas LSH por banda."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # normalizado -> (palavras, shingles, assinatura, resposta)
+        self.buckets = [{} for _ in range(LSH_BANDS)]
+
+    @staticmethod
+    def band_keys(signature: tuple):
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        for band in range(LSH_BANDS):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def add(self, normalized: str, words: frozenset, items: frozenset, signature: tuple, reply: str) -> None:
+        if normalized in self.entries:
+            self.remove(normalized)
+        self.entries[normalized] = (words, items, signature, reply)
+        for band, key in self.band_keys(signature):
+            self.buckets[band].setdefault(key, set()).add(normalized)
+
+    def remove(self, normalized: str) -> None:
+        _, _, signature, _ = self.entries.pop(normalized)
+        for band, key in self.band_keys(signature):
+            bucket = self.buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(normalized)
+                if not bucket:
+                    del self.buckets[band][key]
+
+    def candidates(self, signature: tuple) -> set:
+        found = set()
+        for band, key in self.band_keys(signature):
+            found.update(self.buckets[band].get(key, ()))
+        return found
+
+
+class SemanticCache:
+    """Respostas do tutor por idioma, recuperadas por similaridade da pergunta."""
+
+    def __init__(self, threshold: float = CACHE_THRESHOLD, max_per_language: int = CACHE_MAX_PER_LANGUAGE,
+                 min_chars: int = CACHE_MIN_CHARS):
+        self.threshold = threshold
+        self.max_per_language = max_per_language
+        self.min_chars = min_chars
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "vetoes": 0, "stores": 0, "evictions": 0}
+
+    def _prepare(self, prompt: str):
+        normalized = normalize_prompt(prompt)
+        if len(normalized) < self.min_chars:
+            return None
+        words = normalized.split()
+        content = content_words(words)
+        if not content:
+            return None  # só moldura ("como se diz?"): depende da conversa
+        items = shingles(content)
+        return normalized, frozenset(words), items, minhash(items)
+
+    def lookup(self, lang: str, prompt: str) -> str | None:
+        prepared = self._prepare(prompt)
+        with self._lock:
+            self.stats["lookups"] += 1
+            partition = self._partitions.get(lang)
+            best_reply, best_score, best_key = None, 0.0, None
+            if prepared and partition:
+                normalized, words, items, signature = prepared
+                for candidate in partition.candidates(signature):
+                    candidate_words, candidate_items, _, reply = partition.entries[candidate]
+                    score = jaccard(items, candidate_items)
+                    if score < self.threshold or score <= best_score:
+                        continue
+                    if substituted(words, candidate_words):
+                        self.stats["vetoes"] += 1
+                        continue
+                    best_reply, best_score, best_key = reply, score, candidate
+            if best_reply is not None:
+                partition.entries.move_to_end(best_key)
+                self.stats["hits"] += 1
+                return best_reply
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, lang: str, prompt: str, reply: str) -> bool:
+        prepared = self._prepare(prompt)
+        if not prepared or not reply:
+            return False
+        normalized, words, items, signature = prepared
+        with self._lock:
+            partition = self._partitions.setdefault(lang, _Partition())
+            partition.add(normalized, words, items, signature, reply)
+            self.stats["stores"] += 1
+            while len(partition.entries) > self.max_per_language:
+                partition.remove(next(iter(partition.entries)))
+                self.stats["evictions"] += 1
+        return True
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["lookups"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return sum(len(partition.entries) for partition in self._partitions.values())
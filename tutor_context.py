@@ -0,0 +1,161 @@
+"""Contexto multi-turno do tutor dentro de um orçamento de tokens.
+
+As últimas mensagens vão literalmente; as mais antigas são dobradas em um
+resumo que só recebe as mensagens novas a cada dobra, em vez de ser refeito
+a partir do histórico inteiro. A dobra roda em segundo plano
+(``SummaryFolder``) depois da resposta; até ela terminar, a requisição usa o
+resumo anterior e as mensagens ainda não dobradas que couberem no orçamento.
+"""
+
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("TUTOR_CONTEXT_BUDGET", "2000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("TUTOR_KEEP_TURNS", "3"))
+# dobra só quando acumulam mensagens suficientes, para não chamar o resumo a cada turno
+CONTEXT_FOLD_BATCH = int(os.getenv("TUTOR_FOLD_BATCH", "4"))
+SUMMARY_TOKEN_LIMIT = int(os.getenv("TUTOR_SUMMARY_TOKENS", "300"))
+
+SUMMARY_PROMPT = """
+    Você mantém um resumo curto de uma conversa entre um aluno e um tutor de idiomas.
+    Resumo atual (pode estar vazio):
+    {summary}
+    Novas mensagens:
+    {messages}
+    Atualize o resumo em até {limit} palavras, guardando nível do aluno, erros recorrentes e temas já tratados.
+    Responda só com o resumo.
+    """
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa local (~4 caracteres por token), sem chamada ao modelo."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def format_messages(messages: list) -> str:
+    return "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+
+
+def truncate_to_tokens(text: str, limit: int) -> str:
+    if estimate_tokens(text) <= limit:
+        return text
+    # mantém o final, que tem o que foi dobrado por último
+    return text[-limit * 4:]
+
+
+def extractive_summary(summary: str, messages: list, limit: int = SUMMARY_TOKEN_LIMIT) -> str:
+    """Resumo de reserva quando o modelo não está disponível: concatena e corta."""
+    folded = "\n".join(part for part in (summary, format_messages(messages)) if part)
+    return truncate_to_tokens(folded, limit)
+
+
+def model_summarizer(client, limit: int = SUMMARY_TOKEN_LIMIT):
+    """Resumidor incremental que pede ao modelo para atualizar o resumo com as mensagens novas."""
+
+    def summarize(summary: str, messages: list) -> str:
+        try:
+            response = client.generate_content(
+                SUMMARY_PROMPT.format(summary=summary or "-", messages=format_messages(messages), limit=limit)
+            )
+            return truncate_to_tokens(response.text.strip(), limit)
+        except Exception:  # pragma: no cover - rede/modelo externo
+            return extractive_summary(summary, messages, limit)
+
+    return summarize
+
+
+def new_context_state() -> dict:
+    return {"summary": "", "folded": 0}
+
+
+def fold_span(history: list, state: dict, keep_turns: int = CONTEXT_KEEP_TURNS,
+              fold_batch: int = CONTEXT_FOLD_BATCH) -> tuple | None:
+    """``(início, fim)`` das mensagens a dobrar no resumo, ou ``None`` se ainda não juntou um lote."""
+    keep = max(0, keep_turns * 2)
+    if len(history) - state["folded"] > keep + fold_batch:
+        return state["folded"], len(history) - keep
+    return None
+
+
+class SummaryFolder:
+    """Atualiza resumos em segundo plano, no máximo uma dobra por conversa de cada vez."""
+
+    def __init__(self, workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tutor-summary")
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, state: dict, history: list, summarize, keep_turns: int = CONTEXT_KEEP_TURNS,
+                 fold_batch: int = CONTEXT_FOLD_BATCH) -> bool:
+        """Agenda a dobra se houver um lote pronto; ``state`` é atualizado no lugar quando terminar."""
+        span = fold_span(history, state, keep_turns, fold_batch)
+        if span is None:
+            return False
+        with self._lock:
+            if id(state) in self._running:
+                return False
+            self._running.add(id(state))
+        start, end = span
+        # copia agora: a sessão continua mexendo no histórico enquanto o resumo é feito
+        self._executor.submit(self._fold, state, summarize, state["summary"], list(history[start:end]), start, end)
+        return True
+
+    def _fold(self, state: dict, summarize, summary: str, messages: list, start: int, end: int) -> None:
+        try:
+            folded = summarize(summary, messages)
+            # o histórico pode ter sido trocado (outro idioma, sessão retomada) enquanto isso
+            if state["folded"] == start:
+                state.update(summary=folded, folded=end)
+        finally:
+            with self._lock:
+                self._running.discard(id(state))
+
+
+def build_context(system: str, history: list, prompt: str, state: dict,
+                  budget: int = CONTEXT_TOKEN_BUDGET):
+    """Monta ``contents`` para o Gemini e devolve ``(contents, métricas)``.
+
+    ``history`` são as mensagens anteriores ao ``prompt``; ``state`` guarda o
+    resumo e quantas mensagens já foram dobradas. Nada é resumido aqui: as
+    mensagens ainda não dobradas entram literalmente enquanto couberem.
+    """
+    if state["folded"] > len(history):
+        state.update(new_context_state())
+    pending = history[state["folded"]:]
+
+    fixed_tokens = estimate_tokens(system) + estimate_tokens(prompt)
+    summary = truncate_to_tokens(state["summary"], max(0, budget - fixed_tokens))
+    remaining = budget - fixed_tokens - estimate_tokens(summary)
+    verbatim = []
+    # do mais recente para o mais antigo, até estourar o orçamento
+    for message in reversed(pending):
+        cost = estimate_tokens(message["content"])
+        if cost > remaining:
+            break
+        verbatim.append(message)
+        remaining -= cost
+    verbatim.reverse()
+
+    system_text = system if not summary else f"{system}\nResumo da conversa até aqui: {summary}"
+    contents = [{"role": "user", "parts": system_text}]
+    contents.extend(
+        {"role": "model" if message["role"] == "assistant" else "user", "parts": message["content"]}
+        for message in verbatim
+    )
+    contents.append({"role": "user", "parts": prompt})
+    metrics = {
+        "budget": budget,
+        "system_tokens": estimate_tokens(system),
+        "summary_tokens": estimate_tokens(summary),
+        "history_tokens": sum(estimate_tokens(message["content"]) for message in verbatim),
+        "prompt_tokens": estimate_tokens(prompt),
+        "messages_verbatim": len(verbatim),
+        "messages_folded": state["folded"],
+        "messages_dropped": len(pending) - len(verbatim),
+    }
+    metrics["total_tokens"] = (
+        metrics["system_tokens"] + metrics["summary_tokens"] + metrics["history_tokens"] + metrics["prompt_tokens"]
+    )
+    return contents, metrics